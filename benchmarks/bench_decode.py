@@ -0,0 +1,67 @@
+"""Micro-benchmark of the meter payload decode paths.
+
+Compares the previous ``response.json()`` path (stdlib json, full dict)
+with ``decode_payload`` (orjson when available, only configured keys).
+
+    python benchmarks/bench_decode.py [product_type] [iterations]
+"""
+import importlib.util
+import json
+import sys
+import timeit
+from pathlib import Path
+
+COMPONENT = Path(__file__).resolve().parent.parent / "custom_components" / "adap1ii"
+
+
+def _load(name):
+    # Load the modules directly, the package itself needs Home Assistant
+    spec = importlib.util.spec_from_file_location(f"adap1ii_{name}", COMPONENT / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+product_config = _load("product_config")
+decode = _load("decode")
+
+# Fields the meters send but the integration ignores
+IGNORED_FIELDS = {
+    "username": "admin",
+    "password": "secret",
+    "wifi_ssid": "site-ap",
+    "local_ip": "192.168.1.50",
+    "os_version": "1.4.2",
+    "mac_address": "AA:BB:CC:DD:EE:FF",
+    "cosem_logical_device_name": "ADA0000000000001",
+    "client_id": "ada-0001",
+}
+
+
+def sample_body(product_type):
+    """Return a realistic raw payload for a product."""
+    payload = dict(IGNORED_FIELDS)
+    for index, key in enumerate(product_config.get_product_sensors(product_type)):
+        payload[key] = round(1000 + index * 13.37, 3)
+    payload["timestamp"] = "240101120000W"
+    payload["meter_serial_number"] = "12345678"
+    return json.dumps(payload).encode()
+
+
+def main():
+    product_type = sys.argv[1] if len(sys.argv) > 1 else "ada12"
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    body = sample_body(product_type)
+    keys = decode.build_key_set(product_config.get_product_sensors(product_type))
+
+    full = timeit.timeit(lambda: json.loads(body.decode()), number=iterations)
+    projected = timeit.timeit(lambda: decode.decode_payload(body, keys), number=iterations)
+
+    print(f"product {product_type}, {len(body)} bytes, {len(keys)} keys, {iterations} iterations")
+    print(f"json.loads full payload: {full / iterations * 1e6:8.2f} us/decode")
+    print(f"{decode.json_loads.__module__} projected: {projected / iterations * 1e6:8.2f} us/decode")
+    print(f"speedup: {full / projected:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
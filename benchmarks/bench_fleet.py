@@ -0,0 +1,305 @@
+"""Load test of the integration against a simulated meter fleet.
+
+Starts ``fake_meter.py`` in a subprocess, so its CPU does not count, sets
+up one config entry per fake meter in a Home Assistant test instance and
+measures a steady-state window:
+
+* event-loop CPU time per poll
+* fetch latency and decode time percentiles, overall and per meter
+* entity state writes per second
+* memory allocated per entity during setup
+
+Needs Home Assistant and pytest-homeassistant-custom-component:
+
+    python benchmarks/bench_fleet.py --meters 200 --duration 120 --json run.json
+    python benchmarks/bench_fleet.py --meters 200 --baseline run.json
+
+With ``--baseline`` the exit code is 1 when CPU per poll, fetch p95 or
+memory per entity grew more than ``--tolerance`` over the baseline run.
+
+CPU time is measured for the whole event loop only; per meter the decode
+time stands in for it, since decoding is the CPU bound part of a poll.
+"""
+import argparse
+import asyncio
+import contextvars
+import importlib
+import json
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+
+from homeassistant import loader
+from homeassistant.const import EVENT_STATE_CHANGED
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+from pytest_homeassistant_custom_component.common import MockConfigEntry, async_test_home_assistant
+
+from fake_meter import add_fleet_arguments
+
+ROOT = Path(__file__).resolve().parent.parent
+DOMAIN = "adap1ii"
+# Report keys compared against a baseline, lower is better
+REGRESSION_KEYS = ("cpu_per_poll_ms", "fetch_p95_ms", "memory_per_entity_kb")
+# URL of the meter whose poll runs in the current task, for keying decodes
+polled_url = contextvars.ContextVar("polled_url", default=None)
+
+
+def percentile(values, share):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+def ms(value):
+    return None if value is None else round(value * 1000, 3)
+
+
+def us(value):
+    return None if value is None else round(value * 1e6, 2)
+
+
+class Probe:
+    """Times fetches and decodes by wrapping the integration's own functions."""
+
+    def __init__(self):
+        self.fetch = defaultdict(list)
+        self.fetch_errors = defaultdict(int)
+        self.decode = defaultdict(list)
+        self.writes = defaultdict(int)
+        self._restore = []
+
+    def install(self):
+        http_client = importlib.import_module(f"custom_components.{DOMAIN}.http_client")
+        coordinator = importlib.import_module(f"custom_components.{DOMAIN}.coordinator")
+        fetch = http_client.AdaHttpClient.async_fetch
+        decode = coordinator.decode_payload
+        update = coordinator.Ada12Coordinator._async_update_data
+        probe = self
+
+        async def timed_fetch(client, url, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await fetch(client, url, *args, **kwargs)
+            except Exception:
+                probe.fetch_errors[url] += 1
+                raise
+            finally:
+                probe.fetch[url].append(time.perf_counter() - start)
+
+        def timed_decode(body, keys):
+            start = time.perf_counter()
+            try:
+                return decode(body, keys)
+            finally:
+                probe.decode[polled_url.get()].append(time.perf_counter() - start)
+
+        async def tagged_update(meter):
+            # Each poll runs in its own task, so the tag cannot leak to another meter
+            polled_url.set(meter.url)
+            return await update(meter)
+
+        http_client.AdaHttpClient.async_fetch = timed_fetch
+        coordinator.decode_payload = timed_decode
+        coordinator.Ada12Coordinator._async_update_data = tagged_update
+        self._restore = [
+            (http_client.AdaHttpClient, "async_fetch", fetch),
+            (coordinator, "decode_payload", decode),
+            (coordinator.Ada12Coordinator, "_async_update_data", update),
+        ]
+
+    def uninstall(self):
+        for owner, name, original in self._restore:
+            setattr(owner, name, original)
+
+    def reset(self):
+        self.fetch.clear()
+        self.fetch_errors.clear()
+        self.decode.clear()
+        self.writes.clear()
+
+
+async def start_fleet(args):
+    """Run the fake meters in their own process and return it with the meter URLs."""
+    command = [
+        sys.executable, str(Path(__file__).with_name("fake_meter.py")),
+        "--meters", str(args.meters),
+        "--products", args.products,
+        "--base-port", str(args.base_port),
+        "--publish-period", str(args.publish_period),
+        "--latency", str(args.latency),
+        "--jitter", str(args.jitter),
+        "--failure-rate", str(args.failure_rate),
+    ]
+    process = await asyncio.create_subprocess_exec(*command, stdout=asyncio.subprocess.PIPE)
+    meters = []
+    while len(meters) < args.meters:
+        line = await process.stdout.readline()
+        if not line:
+            raise RuntimeError("fake meter fleet exited during startup")
+        product_type, url = line.decode().split()
+        meters.append((product_type, url))
+    return process, meters
+
+
+async def run(args):
+    process, meters = await start_fleet(args)
+    probe = Probe()
+    try:
+        async with async_test_home_assistant() as hass:
+            hass.config.config_dir = str(ROOT)
+            sys.path.insert(0, str(ROOT))
+            hass.data.pop(loader.DATA_CUSTOM_COMPONENTS, None)
+            assert await async_setup_component(hass, "homeassistant", {})
+            probe.install()
+
+            tracemalloc.start()
+            setup_start = time.perf_counter()
+            entries = []
+            for index, (product_type, url) in enumerate(meters):
+                entry = MockConfigEntry(
+                    domain=DOMAIN,
+                    title=f"bench {index}",
+                    data={"product_type": product_type, "prefix": f"m{index}", "url": url},
+                    options={"change_detection": not args.no_change_detection},
+                )
+                entry.add_to_hass(hass)
+                await hass.config_entries.async_setup(entry.entry_id)
+                entries.append(entry)
+            await hass.async_block_till_done()
+            setup_time = time.perf_counter() - setup_start
+            memory = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            registry = er.async_get(hass)
+            entity_meter = {
+                entity.entity_id: meters[index][1]
+                for index, entry in enumerate(entries)
+                for entity in er.async_entries_for_config_entry(registry, entry.entry_id)
+            }
+
+            def count_write(event):
+                url = entity_meter.get(event.data["entity_id"])
+                if url is not None:
+                    probe.writes[url] += 1
+
+            unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, count_write)
+
+            # Let the first polls settle before measuring
+            await asyncio.sleep(args.warmup)
+            probe.reset()
+            scheduler = hass.data[DOMAIN]["scheduler"]
+            polls_start = scheduler.polls
+            cpu_start = time.thread_time()
+            window_start = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            window = time.perf_counter() - window_start
+            cpu = time.thread_time() - cpu_start
+            polls = scheduler.polls - polls_start
+            unsub()
+
+            scheduler_stats = scheduler.stats()
+            for entry in entries:
+                await hass.config_entries.async_unload(entry.entry_id)
+            await hass.async_block_till_done()
+    finally:
+        probe.uninstall()
+        process.terminate()
+        await process.wait()
+
+    fetches = [value for values in probe.fetch.values() for value in values]
+    decodes = [value for values in probe.decode.values() for value in values]
+    writes = sum(probe.writes.values())
+    entities = len(entity_meter)
+    return {
+        "meters": len(meters),
+        "entities": entities,
+        "duration_s": round(window, 1),
+        "setup_s": round(setup_time, 2),
+        "polls": polls,
+        "cpu_per_poll_ms": ms(cpu / polls) if polls else None,
+        "loop_cpu_share": round(cpu / window, 4),
+        "fetch_p50_ms": ms(percentile(fetches, 0.5)),
+        "fetch_p95_ms": ms(percentile(fetches, 0.95)),
+        "fetch_p99_ms": ms(percentile(fetches, 0.99)),
+        "fetch_errors": sum(probe.fetch_errors.values()),
+        "decode_mean_us": round(sum(decodes) / len(decodes) * 1e6, 2) if decodes else None,
+        "decode_p95_us": us(percentile(decodes, 0.95)),
+        "entity_writes_per_s": round(writes / window, 2),
+        "memory_per_entity_kb": round(memory / entities / 1024, 2) if entities else None,
+        "scheduler": scheduler_stats,
+        "per_meter": {
+            url: {
+                "product_type": product_type,
+                "polls": len(probe.fetch[url]),
+                "fetch_p50_ms": ms(percentile(probe.fetch[url], 0.5)),
+                "fetch_p95_ms": ms(percentile(probe.fetch[url], 0.95)),
+                "fetch_errors": probe.fetch_errors[url],
+                "decode_p50_us": us(percentile(probe.decode[url], 0.5)),
+                "decode_p95_us": us(percentile(probe.decode[url], 0.95)),
+                "entity_writes_per_s": round(probe.writes[url] / window, 2),
+            }
+            for product_type, url in meters
+        },
+    }
+
+
+def print_report(report):
+    for key, value in report.items():
+        if key not in ("per_meter", "scheduler"):
+            print(f"{key:24} {value}")
+    print(f"{'scheduler lag p95':24} {report['scheduler']['lag_p95']}")
+    print()
+    print(
+        f"{'meter':36} {'product':12} {'polls':>6} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7} "
+        f"{'dec p95 us':>10} {'writes/s':>9}"
+    )
+    for url, meter in report["per_meter"].items():
+        print(
+            f"{url:36} {meter['product_type']:12} {meter['polls']:6} {meter['fetch_p50_ms'] or 0:8.2f} "
+            f"{meter['fetch_p95_ms'] or 0:8.2f} {meter['fetch_errors']:7} {meter['decode_p95_us'] or 0:10.2f} "
+            f"{meter['entity_writes_per_s']:9.2f}"
+        )
+
+
+def regressions(report, baseline, tolerance):
+    found = []
+    for key in REGRESSION_KEYS:
+        old, new = baseline.get(key), report.get(key)
+        if old and new and new > old * (1 + tolerance):
+            found.append(f"{key}: {old} -> {new}")
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_fleet_arguments(parser)
+    parser.add_argument("--duration", type=float, default=60, help="measured window in seconds")
+    parser.add_argument("--warmup", type=float, default=15, help="seconds to run before measuring")
+    parser.add_argument("--no-change-detection", action="store_true")
+    parser.add_argument("--json", help="write the report to this file")
+    parser.add_argument("--baseline", help="report of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--quiet", action="store_true", help="skip the per meter table")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    if args.quiet:
+        report_view = {key: value for key, value in report.items() if key != "per_meter"}
+        print(json.dumps(report_view, indent=2))
+    else:
+        print_report(report)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    if args.baseline:
+        found = regressions(report, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for line in found:
+            print(f"REGRESSION {line}")
+        sys.exit(1 if found else 0)
+
+
+if __name__ == "__main__":
+    main()
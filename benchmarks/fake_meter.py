@@ -0,0 +1,143 @@
+"""Simulated fleet of ADA meters served over HTTP.
+
+Every meter listens on its own port, like the real devices on their own
+hosts, and publishes a new payload every ``publish_period`` seconds:
+counters grow, instantaneous values wander, the ``timestamp`` moves on.
+Responses can be delayed, jittered and failed at a configurable rate.
+
+    python benchmarks/fake_meter.py [--meters 10] [--products ada12,adaone]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+from bench_decode import IGNORED_FIELDS, product_config
+
+PRODUCTS = ("ada12", "adaone", "adabridge", "adapziote02")
+BASE_PORT = 18900
+
+
+class FakeMeter:
+    """One meter serving a product payload on ``/json``."""
+
+    def __init__(self, product_type, serial, publish_period=10.0, latency=0.02,
+                 jitter=0.01, failure_rate=0.0, seed=None):
+        self.product_type = product_type
+        self.serial = serial
+        self.publish_period = publish_period
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed if seed is not None else serial)
+        self._counters = {
+            key: self._random.uniform(1000, 20000)
+            for key, config in product_config.get_product_sensors(product_type).items()
+            if config.get("state_class") == "total_increasing"
+        }
+        self._published = None
+        self._body = None
+
+    def body(self, now=None):
+        """Return the encoded payload of the current publish period."""
+        now = time.time() if now is None else now
+        published = now - now % self.publish_period
+        if published != self._published:
+            self._published = published
+            self._body = json.dumps(self._payload(published)).encode()
+        return self._body
+
+    def _payload(self, published):
+        payload = dict(IGNORED_FIELDS)
+        for index, key in enumerate(product_config.get_product_sensors(self.product_type)):
+            if key in self._counters:
+                self._counters[key] += self._random.uniform(0, 0.01)
+                payload[key] = round(self._counters[key], 3)
+            else:
+                payload[key] = round(100 + index + self._random.uniform(-5, 5), 3)
+        payload["timestamp"] = datetime.fromtimestamp(published, timezone.utc).strftime("%y%m%d%H%M%S") + "W"
+        payload["meter_serial_number"] = f"{self.serial:08d}"
+        return payload
+
+    async def handle(self, request):
+        self.requests += 1
+        delay = self.latency + self._random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.failure_rate:
+            self.failures += 1
+            return web.Response(status=503)
+        return web.Response(body=self.body(), content_type="application/json")
+
+
+class FakeMeterFleet:
+    """Starts and stops a set of fake meters on consecutive local ports."""
+
+    def __init__(self, count, products=PRODUCTS, base_port=BASE_PORT, **meter_options):
+        self.meters = [
+            FakeMeter(products[index % len(products)], index + 1, **meter_options)
+            for index in range(count)
+        ]
+        self.base_port = base_port
+        self._runners = []
+
+    def url(self, index):
+        return f"http://127.0.0.1:{self.base_port + index}/json"
+
+    async def async_start(self):
+        for index, meter in enumerate(self.meters):
+            app = web.Application()
+            app.router.add_get("/json", meter.handle)
+            runner = web.AppRunner(app, access_log=None)
+            await runner.setup()
+            await web.TCPSite(runner, "127.0.0.1", self.base_port + index).start()
+            self._runners.append(runner)
+
+    async def async_stop(self):
+        for runner in self._runners:
+            await runner.cleanup()
+        self._runners.clear()
+
+
+async def _serve(args):
+    fleet = FakeMeterFleet(
+        args.meters,
+        products=tuple(args.products.split(",")),
+        base_port=args.base_port,
+        publish_period=args.publish_period,
+        latency=args.latency,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+    )
+    await fleet.async_start()
+    for index, meter in enumerate(fleet.meters):
+        print(f"{meter.product_type:12} {fleet.url(index)}", flush=True)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await fleet.async_stop()
+
+
+def add_fleet_arguments(parser):
+    parser.add_argument("--meters", type=int, default=10)
+    parser.add_argument("--products", default=",".join(PRODUCTS))
+    parser.add_argument("--base-port", type=int, default=BASE_PORT)
+    parser.add_argument("--publish-period", type=float, default=10.0)
+    parser.add_argument("--latency", type=float, default=0.02, help="mean response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.01, help="+/- spread of the delay in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of requests answered with 503")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_fleet_arguments(parser)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
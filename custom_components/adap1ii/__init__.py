@@ -1,13 +1,133 @@
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse
+from homeassistant.exceptions import ConfigEntryNotReady, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+
+from .aggregate import (
+    SIGNAL_METER_LOADED,
+    SIGNAL_METER_UNLOADED,
+    SiteAggregator,
+    aggregate_store,
+    is_aggregate_entry,
+)
+from .coordinator import (
+    SIGNAL_ENTRY_UPDATED,
+    async_acquire_coordinator,
+    async_reconfigure_coordinator,
+    async_release_coordinator,
+    registry_key,
+    snapshot_store,
+)
+from .http_client import AdaHttpClient
+from .scheduler import FleetScheduler
+from .statistics import backfill_store
+from .websocket import async_setup_websocket
 
 DOMAIN = "adap1ii"
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+GET_SAMPLES_SCHEMA = vol.Schema({
+    vol.Required("config_entry_id"): cv.string,
+    vol.Optional("key"): cv.string,
+})
+
+async def async_setup(hass: HomeAssistant, config):
+    """Register the integration services."""
+
+    async def async_get_samples(call: ServiceCall):
+        """Return the raw high-rate sample buffers of a meter."""
+        coordinator = hass.data.get(DOMAIN, {}).get("entries", {}).get(call.data["config_entry_id"])
+        sampler = getattr(coordinator, "sampler", None)
+        if sampler is None:
+            raise ServiceValidationError("High-rate sampling is not enabled for this entry")
+        return {"url": coordinator.url, "samples": sampler.raw(call.data.get("key"))}
+
+    hass.services.async_register(
+        DOMAIN,
+        "get_samples",
+        async_get_samples,
+        schema=GET_SAMPLES_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    async_setup_websocket(hass)
+    return True
+
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Set up Ada12 from a config entry."""
+    domain_data = hass.data.setdefault(DOMAIN, {})
+    if is_aggregate_entry(entry):
+        # Meters loading later join the sums through the dispatcher
+        aggregator = SiteAggregator(hass, entry.entry_id, entry.data["meters"])
+        domain_data.setdefault("aggregates", {})[entry.entry_id] = aggregator
+        await aggregator.async_load()
+        aggregator.async_start()
+        await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+        return True
+
+    client = domain_data.get("client")
+    if client is None:
+        client = domain_data["client"] = AdaHttpClient(hass)
+    client.acquire()
+    if "scheduler" not in domain_data:
+        domain_data["scheduler"] = FleetScheduler(hass)
+
+    # Entries pointing at the same meter share one coordinator
+    config_data = {**entry.data, **entry.options}
+    coordinator = await async_acquire_coordinator(hass, entry.entry_id, config_data)
+    domain_data.setdefault("entries", {})[entry.entry_id] = coordinator
+    if not coordinator.last_update_success:
+        await _async_release(hass, entry)
+        raise ConfigEntryNotReady(f"Cannot fetch data from {coordinator.url}")
+
     await hass.config_entries.async_forward_entry_setups(entry, ["sensor"])
+    entry.async_on_unload(entry.add_update_listener(_async_entry_updated))
+    async_dispatcher_send(hass, SIGNAL_METER_LOADED, entry.entry_id)
     return True
 
+async def _async_entry_updated(hass: HomeAssistant, entry: ConfigEntry):
+    """Apply changed options to the running coordinator and entities, reload only if they cannot take them."""
+    coordinator = hass.data[DOMAIN]["entries"][entry.entry_id]
+    config_data = {**entry.data, **entry.options}
+    if coordinator.entry_configs.get(entry.entry_id) == config_data:
+        return
+    if not await async_reconfigure_coordinator(hass, entry.entry_id, coordinator, config_data):
+        await hass.config_entries.async_reload(entry.entry_id)
+        return
+    async_dispatcher_send(hass, SIGNAL_ENTRY_UPDATED.format(entry.entry_id), config_data)
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
     """Unload Ada12 config entry."""
-    return await hass.config_entries.async_unload_platforms(entry, ["sensor"])
+    unload_ok = await hass.config_entries.async_unload_platforms(entry, ["sensor"])
+    if unload_ok:
+        if is_aggregate_entry(entry):
+            hass.data[DOMAIN]["aggregates"].pop(entry.entry_id).async_stop()
+        else:
+            await _async_release(hass, entry)
+    return unload_ok
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry):
+    """Forget the counter samples, and the snapshot once no entry uses the meter any more."""
+    if is_aggregate_entry(entry):
+        await aggregate_store(hass, entry.entry_id).async_remove()
+        return
+    await backfill_store(hass, entry.entry_id).async_remove()
+    key = registry_key({**entry.data, **entry.options})
+    for other in hass.config_entries.async_entries(DOMAIN):
+        if is_aggregate_entry(other) or other.entry_id == entry.entry_id:
+            continue
+        if key == registry_key({**other.data, **other.options}):
+            return
+    await snapshot_store(hass, key).async_remove()
+
+async def _async_release(hass: HomeAssistant, entry: ConfigEntry):
+    """Release the shared coordinator and HTTP client of an entry."""
+    domain_data = hass.data[DOMAIN]
+    async_dispatcher_send(hass, SIGNAL_METER_UNLOADED, entry.entry_id)
+    coordinator = domain_data["entries"].pop(entry.entry_id)
+    await async_release_coordinator(hass, entry.entry_id, coordinator)
+    if await domain_data["client"].async_release() == 0:
+        domain_data.pop("client")
@@ -0,0 +1,173 @@
+"""Site totals summed across several ADA meter entries."""
+import logging
+from functools import partial
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+
+from .product_config import SITE_TOTAL_SOURCES, SITE_TOTAL_SPECS
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "adap1ii"
+ENTRY_TYPE_AGGREGATE = "aggregate"
+SIGNAL_METER_LOADED = f"{DOMAIN}_meter_loaded"
+SIGNAL_METER_UNLOADED = f"{DOMAIN}_meter_unloaded"
+# The running sums are rebuilt from the contributions this often, against float drift
+RESYNC_EVERY = 1000
+# Counters keep the last value of a stale meter, a dropping total would read as a meter reset
+CARRIED_KEYS = frozenset(spec.key for spec in SITE_TOTAL_SPECS if spec.state_class == "total_increasing")
+STORE_VERSION = 1
+SAVE_DELAY = 300
+
+
+def is_aggregate_entry(entry):
+    return entry.data.get("entry_type") == ENTRY_TYPE_AGGREGATE
+
+
+def aggregate_store(hass, entry_id):
+    """Return the Store holding the counters each meter carries into the site totals."""
+    return Store(hass, STORE_VERSION, f"{DOMAIN}.aggregate.{entry_id}")
+
+
+class SiteAggregator(DataUpdateCoordinator):
+    """Keeps site totals as running sums updated from the deltas of each meter.
+
+    ``data`` maps every total to its value and to the meters missing from
+    it: unloaded or failing meters, and meters without the key. Their
+    instantaneous values are left out, their counters are carried over.
+    The carried counters are kept in a Store, so a meter that is offline or
+    slow after a restart does not drop the totals either.
+    """
+
+    def __init__(self, hass, entry_id, meter_ids):
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=None,
+            name=f"ADA site {entry_id}",
+            update_interval=None,
+            always_update=False,
+        )
+        self.meter_ids = tuple(meter_ids)
+        self.totals = dict.fromkeys(SITE_TOTAL_SOURCES, 0.0)
+        # meter entry id -> {total key: value it contributes}
+        self.contributions = {meter_id: {} for meter_id in self.meter_ids}
+        self.live = set()
+        self.updates = 0
+        self._meter_unsubs = {}
+        self._signal_unsubs = []
+        self._store = aggregate_store(hass, entry_id)
+        self._save_pending = False
+
+    async def async_load(self):
+        """Restore the counters the meters contributed before the restart."""
+        stored = await self._store.async_load() or {}
+        for meter_id, counters in stored.items():
+            if meter_id not in self.contributions:
+                continue
+            for key, value in counters.items():
+                if key in CARRIED_KEYS:
+                    self._set_contribution(meter_id, key, value)
+
+    @callback
+    def async_start(self):
+        """Subscribe to the meters that are loaded and to later (un)loads."""
+        entries = self.hass.data[DOMAIN].get("entries", {})
+        for meter_id in self.meter_ids:
+            if meter_id in entries:
+                self._async_attach(meter_id, entries[meter_id])
+        self._signal_unsubs = [
+            async_dispatcher_connect(self.hass, SIGNAL_METER_LOADED, self._async_meter_loaded),
+            async_dispatcher_connect(self.hass, SIGNAL_METER_UNLOADED, self._async_meter_unloaded),
+        ]
+        self._async_publish()
+
+    @callback
+    def async_stop(self):
+        for unsub in (*self._signal_unsubs, *self._meter_unsubs.values()):
+            unsub()
+        self._signal_unsubs = []
+        self._meter_unsubs = {}
+
+    @callback
+    def _async_meter_loaded(self, meter_id):
+        if meter_id in self.contributions and meter_id not in self._meter_unsubs:
+            self._async_attach(meter_id, self.hass.data[DOMAIN]["entries"][meter_id])
+            self._async_publish()
+
+    @callback
+    def _async_meter_unloaded(self, meter_id):
+        unsub = self._meter_unsubs.pop(meter_id, None)
+        if unsub is not None:
+            unsub()
+            self._set_stale(meter_id)
+            self._async_publish()
+
+    @callback
+    def _async_attach(self, meter_id, coordinator):
+        self._meter_unsubs[meter_id] = coordinator.async_add_listener(
+            partial(self._async_meter_updated, meter_id, coordinator)
+        )
+        self._async_meter_updated(meter_id, coordinator, publish=False)
+
+    @callback
+    def _async_meter_updated(self, meter_id, coordinator, publish=True):
+        data = coordinator.data
+        if not coordinator.last_update_success or coordinator.stale or not data:
+            self._set_stale(meter_id)
+        else:
+            # A meter coming back contributes every key again
+            changed = coordinator.changed_keys if meter_id in self.live else None
+            self.live.add(meter_id)
+            for key, sources in SITE_TOTAL_SOURCES.items():
+                if changed is not None and not any(source in changed for source in sources):
+                    continue
+                value = next((data[source] for source in sources if data.get(source) is not None), None)
+                self._set_contribution(meter_id, key, value)
+        if publish:
+            self._async_publish()
+
+    def _set_contribution(self, meter_id, key, value):
+        contribution = self.contributions[meter_id]
+        old = contribution.pop(key, None)
+        if value is not None:
+            contribution[key] = value
+        self.totals[key] += (value or 0.0) - (old or 0.0)
+
+    def _set_stale(self, meter_id):
+        self.live.discard(meter_id)
+        for key in list(self.contributions[meter_id]):
+            if key not in CARRIED_KEYS:
+                self._set_contribution(meter_id, key, None)
+
+    @callback
+    def _async_publish(self):
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            for key in self.totals:
+                self.totals[key] = sum(
+                    contribution.get(key, 0.0) for contribution in self.contributions.values()
+                )
+        site = {}
+        for key, total in self.totals.items():
+            missing = tuple(
+                meter_id
+                for meter_id in self.meter_ids
+                if meter_id not in self.live or key not in self.contributions[meter_id]
+            )
+            reporting = any(key in contribution for contribution in self.contributions.values())
+            site[key] = {"value": round(total, 4) if reporting else None, "missing": missing}
+        self.async_set_updated_data(site)
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def _data_to_save(self):
+        self._save_pending = False
+        return {
+            meter_id: {key: value for key, value in contribution.items() if key in CARRIED_KEYS}
+            for meter_id, contribution in self.contributions.items()
+        }
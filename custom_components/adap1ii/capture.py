@@ -0,0 +1,205 @@
+"""Capture of raw meter responses and their replay through the poll pipeline."""
+import base64
+import gzip
+import itertools
+import json
+import logging
+import os
+import time
+import zlib
+
+from homeassistant.core import callback
+from homeassistant.util import slugify
+
+from .http_client import FetchResult
+from .metrics import failure_category
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "adap1ii"
+CAPTURE_DIR = f"{DOMAIN}_captures"
+DEFAULT_MAX_SIZE = 10  # MB
+# Rotated files kept next to the live one, as .1.gz (newest) ... .N.gz
+BACKUPS = 5
+# Buffered responses are written once the oldest is this many seconds old
+FLUSH_INTERVAL = 5
+REPLAY_BATCH = 500
+DEFAULT_REPLAY_SPEED = 1.0
+
+
+def capture_path(hass, registry_key):
+    """Return the capture file of a meter."""
+    return hass.config.path(CAPTURE_DIR, f"{slugify(registry_key)}.jsonl.gz")
+
+
+def encode_record(received, body=None, seconds=None, not_modified=False, error=None):
+    """Return one capture line: receive time, fetch time and the raw body or error."""
+    record = {"t": round(received, 3)}
+    if seconds is not None:
+        record["s"] = round(seconds, 4)
+    if error is not None:
+        record["error"] = failure_category(error)
+        record["message"] = str(error)
+    elif not_modified:
+        record["not_modified"] = True
+    else:
+        try:
+            record["body"] = body.decode()
+        except UnicodeDecodeError:
+            # Malformed payloads are what captures are for, keep the exact bytes
+            record["b64"] = base64.b64encode(body).decode()
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode()
+
+
+def decode_record(line):
+    """Parse a capture line, with the body as bytes under ``body``."""
+    record = json.loads(line)
+    if "b64" in record:
+        record["body"] = base64.b64decode(record.pop("b64"))
+    elif "body" in record:
+        record["body"] = record["body"].encode()
+    return record
+
+
+def read_lines(file, path):
+    """Yield the lines of a capture, up to a last block a crash or a running capture left unfinished."""
+    try:
+        yield from file
+    except (EOFError, zlib.error) as err:
+        _LOGGER.warning("Capture %s ends in an unfinished block, reading up to it: %s", path, err)
+
+
+def read_first_body(path):
+    """Return the first captured body of a file, for setting up a replay entry."""
+    with gzip.open(path, "rb") as file:
+        for line in read_lines(file, path):
+            record = decode_record(line)
+            if record.get("body") is not None:
+                return record["body"]
+    raise ValueError(f"No payload captured in {path}")
+
+
+class PayloadRecorder:
+    """Appends raw responses to a gzip compressed JSON lines file.
+
+    Lines are buffered and written by the executor in batches. Every batch
+    ends with a sync flush, so a crash loses at most the last batch; readers
+    stop at the unfinished block. Past ``max_size`` MB the file is rotated.
+    """
+
+    def __init__(self, hass, path, max_size=DEFAULT_MAX_SIZE, backups=BACKUPS):
+        self._hass = hass
+        self.path = path
+        self._max_bytes = max_size * 1024 * 1024
+        self._backups = backups
+        self._buffer = []
+        self._first_buffered = None
+        self._flush_task = None
+        self._file = None
+        self._raw = None
+        self.records = 0
+        self.rotations = 0
+
+    @callback
+    def add(self, received, body=None, seconds=None, not_modified=False, error=None):
+        self._buffer.append(encode_record(received, body, seconds, not_modified, error))
+        self.records += 1
+        if self._first_buffered is None:
+            self._first_buffered = time.monotonic()
+        if self._flush_task is None and time.monotonic() - self._first_buffered >= FLUSH_INTERVAL:
+            self._flush_task = self._hass.async_create_background_task(
+                self._async_flush(), f"{DOMAIN} capture {self.path}"
+            )
+
+    async def async_close(self):
+        if self._flush_task is not None:
+            await self._flush_task
+        await self._async_flush(close=True)
+
+    async def _async_flush(self, close=False):
+        lines, self._buffer, self._first_buffered = self._buffer, [], None
+        try:
+            await self._hass.async_add_executor_job(self._write, lines, close)
+        except OSError as err:
+            _LOGGER.warning("Cannot write the capture file %s: %s", self.path, err)
+        finally:
+            self._flush_task = None
+
+    def _write(self, lines, close):
+        if lines:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                # Appending starts a new gzip member, readers see one stream
+                self._raw = open(self.path, "ab")
+                self._file = gzip.GzipFile(fileobj=self._raw, mode="ab")
+            self._file.writelines(lines)
+            self._file.flush()
+            if self._raw.tell() >= self._max_bytes:
+                self._close_file()
+                self._rotate()
+        if close:
+            self._close_file()
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._raw.close()
+            self._file = self._raw = None
+
+    def _rotate(self):
+        stem = self.path[: -len(".gz")]
+        for index in range(self._backups - 1, 0, -1):
+            if os.path.exists(f"{stem}.{index}.gz"):
+                os.replace(f"{stem}.{index}.gz", f"{stem}.{index + 1}.gz")
+        os.replace(self.path, f"{stem}.1.gz")
+        self.rotations += 1
+
+
+class ReplaySource:
+    """Stands in for the HTTP client and answers with captured responses.
+
+    ``current`` is the record the next fetch returns; the replay
+    coordinator advances it at the pace of the capture.
+    """
+
+    def __init__(self, hass, path):
+        self._hass = hass
+        self.path = path
+        self.current = None
+        self._file = None
+        self._lines = None
+        self._batch = iter(())
+
+    async def async_next(self):
+        """Return the next record, or None at the end of the file."""
+        record = next(self._batch, None)
+        if record is None:
+            records = await self._hass.async_add_executor_job(self._read_batch)
+            self._batch = iter(records)
+            record = next(self._batch, None)
+        return record
+
+    async def async_rewind(self):
+        await self.async_close()
+
+    async def async_close(self):
+        if self._file is not None:
+            await self._hass.async_add_executor_job(self._file.close)
+        self._file = self._lines = None
+        self._batch = iter(())
+
+    def _read_batch(self):
+        if self._file is None:
+            self._file = gzip.open(self.path, "rb")
+            self._lines = read_lines(self._file, self.path)
+        return [decode_record(line) for line in itertools.islice(self._lines, REPLAY_BATCH) if line.strip()]
+
+    async def async_fetch(self, url, etag=None, last_modified=None):
+        record = self.current
+        if "error" in record:
+            message = record.get("message", record["error"])
+            raise TimeoutError(message) if record["error"] == "timeout" else ConnectionError(message)
+        timings = {"total": record["s"]} if "s" in record else {}
+        if record.get("not_modified"):
+            return FetchResult(None, etag, last_modified, True, timings)
+        return FetchResult(record["body"], None, None, False, timings)
@@ -1,95 +1,444 @@
 from homeassistant import config_entries
 import voluptuous as vol
 from homeassistant.core import callback
+from homeassistant.helpers import config_validation as cv
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import asyncio
+import json
 import logging
-import aiohttp
 import async_timeout
+from yarl import URL
 
-from .product_config import get_product_list, get_product_name, get_product_sensors, PRODUCT_CONFIGS
+from .aggregate import ENTRY_TYPE_AGGREGATE, is_aggregate_entry
+from .capture import DEFAULT_MAX_SIZE, DEFAULT_REPLAY_SPEED, read_first_body
+from .dsmr import DEFAULT_DSMR_PORT, async_read_telegram
+from .coordinator import build_url
+from .resolver import MeterResolver, async_update_pin, is_mdns_host
+from .sampling import AGGREGATES, DEFAULT_PUBLISH_INTERVAL, DEFAULT_SAMPLE_INTERVAL
+from .scheduler import DEFAULT_MAX_INTERVAL, DEFAULT_MIN_INTERVAL
+from .product_config import (
+    DEFAULT_DEADBANDS,
+    DEFAULT_MAX_AGE,
+    MIN_MATCH_SCORE,
+    PRODUCT_CONFIGS,
+    detect_product,
+    get_product_list,
+    get_product_name,
+    is_ambiguous,
+    rank_products,
+)
 
 DOMAIN = "adap1ii"
 _LOGGER = logging.getLogger(__name__)
 
+TRANSPORTS = {
+    "http": "HTTP JSON polling",
+    "dsmr": "P1 telegram stream (DSMR)",
+    "replay": "Replay of a capture file",
+}
+AUTO_PRODUCT = "auto"
+# Shared deadline of all discovery probes of one device
+DISCOVERY_PROBE_TIMEOUT = 10
+
+
+def _normalize_host(host):
+    return host.lower().rstrip(".")
+
+
+def discovery_candidates(host):
+    """Return the JSON endpoints to probe on a host, with the products served on each."""
+    candidates = {}
+    for product_type, conf in PRODUCT_CONFIGS.items():
+        url = f"http://{host}:{conf['default_port']}/json"
+        candidates.setdefault(url, []).append(product_type)
+    return candidates
+
+
+async def async_fetch_for_config(hass, config):
+    """Read a payload for user supplied settings, probing endpoints when needed.
+
+    Returns the payload and the host/port that answered when they had to be
+    detected, so the entry polls the same endpoint.
+    """
+    product_type = config.get("product_type", AUTO_PRODUCT)
+    product = PRODUCT_CONFIGS.get(product_type, PRODUCT_CONFIGS["ada12"])
+    host = config.get("host")
+    url = config.get("url")
+
+    if config.get("transport") == "dsmr":
+        return await async_read_telegram(
+            host or product["host"], config.get("dsmr_port") or DEFAULT_DSMR_PORT
+        ), {}
+
+    if config.get("transport") == "replay":
+        # The first captured payload stands in for the meter
+        data = json.loads(await hass.async_add_executor_job(read_first_body, config.get("replay_file")))
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data, {}
+
+    session = async_get_clientsession(hass)
+    if url:
+        candidates = {url: list(PRODUCT_CONFIGS)}
+    elif product_type != AUTO_PRODUCT:
+        # Ha nincs teljes URL, építsük össze host+port alapján
+        port = config.get("port") or product["default_port"]
+        candidates = {f"http://{host or product['host']}:{port}/json": [product_type]}
+    elif host:
+        candidates = {f"http://{host}:{config.get('port') or 8989}/json": list(PRODUCT_CONFIGS)}
+        for candidate, product_types in discovery_candidates(host).items():
+            candidates.setdefault(candidate, product_types)
+    else:
+        candidates = {
+            f"http://{conf['host']}:{conf['default_port']}/json": [key]
+            for key, conf in PRODUCT_CONFIGS.items()
+        }
+
+    if len(candidates) == 1:
+        (candidate,) = candidates
+        async with async_timeout.timeout(10):
+            async with session.get(candidate) as response:
+                if response.status != 200:
+                    raise ValueError(f"HTTP {response.status}")
+                data = await response.json(content_type=None)
+        if not isinstance(data, dict):
+            raise ValueError("Expected a JSON object")
+        return data, {}
+
+    found = await async_probe_endpoints(session, candidates)
+    if found is None:
+        raise ValueError("No ADA meter answered")
+    candidate, _product_type, data = found
+    if url:
+        return data, {}
+    answered = URL(candidate)
+    return data, {"host": answered.host, "port": answered.port}
+
+
+async def async_probe_endpoints(session, candidates, timeout=DISCOVERY_PROBE_TIMEOUT):
+    """Probe all candidate endpoints at once and return the first valid (url, product_type, data)."""
+
+    async def probe(url, product_types):
+        async with session.get(url) as response:
+            if response.status != 200:
+                raise ValueError(f"HTTP {response.status}")
+            data = await response.json(content_type=None)
+        product_type = detect_product(data, product_types) if isinstance(data, dict) else None
+        if product_type is None:
+            raise ValueError("No expected sensors found in JSON")
+        return url, product_type, data
+
+    tasks = [asyncio.create_task(probe(url, products)) for url, products in candidates.items()]
+    try:
+        async with asyncio.timeout(timeout):
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    return await next_done
+                except Exception as err:  # pylint: disable=broad-except
+                    _LOGGER.debug("Discovery probe failed: %s", err)
+    except TimeoutError:
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+    return None
+
 
 class Ada12ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
+    _discovered = None
+    _pending = None
+    _ranking = ()
 
     async def async_step_user(self, user_input=None):
+        """Offer a site aggregate once there are meters to sum."""
+        if user_input is None and len(self._async_meter_entries()) >= 2:
+            return self.async_show_menu(step_id="user", menu_options=["meter", "aggregate"])
+        return await self.async_step_meter(user_input)
+
+    async def async_step_meter(self, user_input=None):
         errors = {}
-        product_options = {
-            key: f"{conf['name']} (host: {conf['host']}, port: {conf['default_port']})"
+        product_options = {AUTO_PRODUCT: "Automatic detection"}
+        product_options.update(
+            (key, f"{conf['name']} (host: {conf['host']}, port: {conf['default_port']})")
             for key, conf in PRODUCT_CONFIGS.items()
-        }
+        )
 
         if user_input is not None:
-            product_type = user_input.get("product_type", "ada12")
-            prefix = user_input.get("prefix", "")
-            url = user_input.get("url")
-            host = user_input.get("host")
-            port = user_input.get("port", 8989)
-
-            # Ha nincs teljes URL, építsük össze host+port alapján
-            if not url:
-                if not host:
-                    host = PRODUCT_CONFIGS.get(product_type, {}).get("host", "okosvillanyora.local")
-                if not port:
-                    port = PRODUCT_CONFIGS.get(product_type, {}).get("default_port", 8989)
-                url = f"http://{host}:{port}/json"
-
-            # Próbáljunk csatlakozni a JSON-hoz és ellenőrizzük a szenzorokat
+            product_type = user_input.get("product_type", AUTO_PRODUCT)
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with async_timeout.timeout(10):
-                        async with session.get(url) as response:
-                            if response.status != 200:
-                                raise Exception(f"HTTP {response.status}")
-                            data = await response.json()
-
-                # Ellenőrizzük, hogy legalább az egyik szenzor kulcs létezik
-                expected_sensors = get_product_sensors(product_type)
-                if not any(key in data for key in expected_sensors):
-                    raise Exception("No expected sensors found in JSON")
-
-                # Minden rendben, létrehozzuk az entry-t
-                title = get_product_name(product_type)
-                if prefix:
-                    title = f"{prefix} {title}"
-                return self.async_create_entry(title=title, data=user_input)
+                data, endpoint = await async_fetch_for_config(self.hass, user_input)
+                if product_type == AUTO_PRODUCT:
+                    # Keep the endpoint that answered, the entry must poll the same one
+                    user_input = {**user_input, **endpoint}
+                    ranking = rank_products(data)
+                    if is_ambiguous(ranking):
+                        self._pending = user_input
+                        self._ranking = ranking
+                        return await self.async_step_select_product()
+                    product_type = detect_product(data)
+                    if product_type is None:
+                        raise ValueError("No expected sensors found in JSON")
+                elif detect_product(data, [product_type]) is None:
+                    errors["product_type"] = "wrong_product"
+                if not errors:
+                    return self._async_create_meter_entry({**user_input, "product_type": product_type})
 
             except Exception as err:
-                _LOGGER.error("Cannot connect to %s: %s", url, err)
+                _LOGGER.error("Cannot connect to %s: %s", user_input.get("url") or user_input.get("host"), err)
                 errors["base"] = "cannot_connect"
 
         data_schema = vol.Schema({
-            vol.Required("product_type", default="ada12"): vol.In(product_options),
+            vol.Required("product_type", default=AUTO_PRODUCT): vol.In(product_options),
             vol.Optional("prefix", default=""): str,
             vol.Optional("host", default=""): str,
             vol.Optional("port", default=8989): int,
             vol.Optional("url", default=""): str,
+            vol.Optional("transport", default="http"): vol.In(TRANSPORTS),
+            vol.Optional("dsmr_port", default=DEFAULT_DSMR_PORT): int,
+            vol.Optional("replay_file", default=""): str,
+            vol.Optional("replay_speed", default=DEFAULT_REPLAY_SPEED): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+        })
+
+        return self.async_show_form(step_id="meter", data_schema=data_schema, errors=errors)
+
+    async def async_step_aggregate(self, user_input=None):
+        """Create a site device summing the selected meter entries."""
+        errors = {}
+        meters = {entry.entry_id: entry.title for entry in self._async_meter_entries()}
+        if user_input is not None:
+            if len(user_input["meters"]) < 2:
+                errors["meters"] = "select_two_meters"
+            else:
+                return self.async_create_entry(
+                    title=user_input["name"],
+                    data={
+                        "entry_type": ENTRY_TYPE_AGGREGATE,
+                        "name": user_input["name"],
+                        "meters": list(user_input["meters"]),
+                    },
+                )
+
+        data_schema = vol.Schema({
+            vol.Required("name", default="Site"): str,
+            vol.Required("meters", default=list(meters)): cv.multi_select(meters),
         })
+        return self.async_show_form(step_id="aggregate", data_schema=data_schema, errors=errors)
+
+    @callback
+    def _async_meter_entries(self):
+        return [
+            entry
+            for entry in self._async_current_entries(include_ignore=False)
+            if not is_aggregate_entry(entry)
+        ]
+
+    async def async_step_select_product(self, user_input=None):
+        """Let the user pick from the products the payload matched equally well."""
+        if user_input is not None:
+            return self._async_create_meter_entry({**self._pending, **user_input})
+
+        choices = {
+            product_type: f"{get_product_name(product_type)} ({score:.0%})"
+            for product_type, score in self._ranking
+            if score >= MIN_MATCH_SCORE
+        }
+        return self.async_show_form(
+            step_id="select_product",
+            data_schema=vol.Schema({vol.Required("product_type"): vol.In(choices)}),
+        )
+
+    @callback
+    def _async_create_meter_entry(self, data):
+        # Minden rendben, létrehozzuk az entry-t
+        title = get_product_name(data["product_type"])
+        if data.get("prefix"):
+            title = f"{data['prefix']} {title}"
+        return self.async_create_entry(title=title, data=data)
+
+    async def async_step_ssdp(self, discovery_info):
+        """Handle a GreenHESS ADA device found via SSDP."""
+        if not discovery_info.ssdp_location:
+            return self.async_abort(reason="no_host")
+        return await self._async_step_discovered(URL(discovery_info.ssdp_location).host)
+
+    async def async_step_zeroconf(self, discovery_info):
+        """Handle an ADA device announced via zeroconf."""
+        # A new address of a configured meter replaces its pinned one right away
+        async_update_pin(self.hass, discovery_info.hostname, discovery_info.ip_address)
+        return await self._async_step_discovered(discovery_info.host, discovery_info.hostname)
+
+    async def _async_step_discovered(self, host, hostname=None):
+        if not host:
+            return self.async_abort(reason="no_host")
+        await self._async_abort_if_host_configured(host, hostname)
+
+        session = async_get_clientsession(self.hass)
+        found = await async_probe_endpoints(session, discovery_candidates(host))
+        if found is None:
+            return self.async_abort(reason="cannot_connect")
+        url, product_type, data = found
+
+        # The meter serial is stable across DHCP leases, the host is not
+        await self.async_set_unique_id(str(data.get("meter_serial_number") or host))
+        self._async_abort_if_serial_configured(host)
+
+        self._discovered = {
+            "product_type": product_type,
+            "host": host,
+            "port": URL(url).port,
+        }
+        self.context["title_placeholders"] = {"name": get_product_name(product_type), "host": host}
+        return await self.async_step_discovery_confirm()
+
+    async def async_step_discovery_confirm(self, user_input=None):
+        """Confirm adding a discovered meter."""
+        discovered = self._discovered
+        if user_input is not None:
+            prefix = user_input.get("prefix", "")
+            title = get_product_name(discovered["product_type"])
+            if prefix:
+                title = f"{prefix} {title}"
+            return self.async_create_entry(
+                title=title, data={**discovered, "prefix": prefix, "url": ""}
+            )
+
+        return self.async_show_form(
+            step_id="discovery_confirm",
+            data_schema=vol.Schema({vol.Optional("prefix", default=""): str}),
+            description_placeholders=self.context["title_placeholders"],
+        )
 
-        return self.async_show_form(step_id="user", data_schema=data_schema, errors=errors)
+    @callback
+    def _async_abort_if_serial_configured(self, host):
+        """Abort if the meter is configured, pointing its entry at the announced address first.
+
+        A host saved in the options overrides the one in the data, so both
+        are updated; the update listener applies the change.
+        """
+        for entry in self._async_current_entries():
+            if entry.unique_id != self.unique_id:
+                continue
+            changes = {}
+            if entry.data.get("host") != host:
+                changes["data"] = {**entry.data, "host": host}
+            if entry.options.get("host", host) != host:
+                changes["options"] = {**entry.options, "host": host}
+            if changes:
+                self.hass.config_entries.async_update_entry(entry, **changes)
+            raise config_entries.AbortFlow("already_configured")
+
+    async def _async_abort_if_host_configured(self, *announced):
+        """Abort if an entry added by hand already polls the announced address or host name.
+
+        Manual entries have no unique id and usually name the meter by its
+        ``.local`` host, or leave host and URL empty for the default one,
+        while SSDP and zeroconf announce its address.
+        """
+        announced = {_normalize_host(host) for host in announced if host}
+        mdns_hosts = set()
+        for entry in self._async_meter_entries():
+            config_data = {**entry.data, **entry.options}
+            if config_data.get("transport") == "replay":
+                continue
+            # The host the coordinator actually polls, defaults included
+            configured = {
+                _normalize_host(host)
+                for host in (config_data.get("host"), URL(build_url(config_data)).host)
+                if host
+            }
+            if announced & configured:
+                raise config_entries.AbortFlow("already_configured")
+            mdns_hosts.update(host for host in configured if is_mdns_host(host))
+
+        if not mdns_hosts:
+            return
+        client = self.hass.data.get(DOMAIN, {}).get("client")
+        resolver = client.resolver if client is not None else MeterResolver(self.hass)
+        for host in mdns_hosts:
+            # Pinned by the running entries, or looked up now
+            if await resolver.async_resolve(host) in announced:
+                raise config_entries.AbortFlow("already_configured")
 
     @staticmethod
     @callback
     def async_get_options_flow(config_entry):
         return Ada12OptionsFlowHandler()
 
+    @classmethod
+    @callback
+    def async_supports_options_flow(cls, config_entry):
+        # Site aggregates have nothing to tune
+        return not is_aggregate_entry(config_entry)
+
 
 class Ada12OptionsFlowHandler(config_entries.OptionsFlow):
     async def async_step_init(self, user_input=None):
+        errors = {}
+        current = {**self.config_entry.data, **self.config_entry.options}
         if user_input is not None:
-            return self.async_create_entry(title="", data=user_input)
+            if user_input.get("product_type") == AUTO_PRODUCT:
+                try:
+                    data, endpoint = await async_fetch_for_config(self.hass, {**current, **user_input})
+                    product_type = detect_product(data)
+                    if product_type is None:
+                        raise ValueError("No expected sensors found in JSON")
+                    user_input = {**user_input, **endpoint, "product_type": product_type}
+                except Exception as err:
+                    _LOGGER.error("Cannot detect the product: %s", err)
+                    errors["base"] = "cannot_connect"
+            if not errors:
+                return self.async_create_entry(title="", data=user_input)
 
-        product_options = dict(get_product_list())
+        product_options = {AUTO_PRODUCT: "Automatic detection", **dict(get_product_list())}
         options_schema = vol.Schema({
             vol.Optional(
-                "product_type", default=self.config_entry.data.get("product_type", "ada12")
+                "product_type", default=current.get("product_type", "ada12")
             ): vol.In(product_options),
-            vol.Optional("prefix", default=self.config_entry.data.get("prefix", "")): str,
-            vol.Optional("host", default=self.config_entry.data.get("host", "")): str,
-            vol.Optional("port", default=self.config_entry.data.get("port", 8989)): int,
-            vol.Optional("url", default=self.config_entry.data.get("url", "")): str,
+            vol.Optional("prefix", default=current.get("prefix", "")): str,
+            vol.Optional("host", default=current.get("host", "")): str,
+            vol.Optional("port", default=current.get("port", 8989)): int,
+            vol.Optional("url", default=current.get("url", "")): str,
+            vol.Optional("transport", default=current.get("transport", "http")): vol.In(TRANSPORTS),
+            vol.Optional("dsmr_port", default=current.get("dsmr_port", DEFAULT_DSMR_PORT)): int,
+            vol.Optional("replay_file", default=current.get("replay_file", "")): str,
+            vol.Optional(
+                "replay_speed", default=current.get("replay_speed", DEFAULT_REPLAY_SPEED)
+            ): vol.All(vol.Coerce(float), vol.Range(min=0)),
+            vol.Optional("replay_repeat", default=current.get("replay_repeat", False)): bool,
+            vol.Optional("capture", default=current.get("capture", False)): bool,
+            vol.Optional(
+                "capture_max_size", default=current.get("capture_max_size", DEFAULT_MAX_SIZE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=1000)),
+            vol.Optional("change_detection", default=current.get("change_detection", True)): bool,
+            vol.Optional("adaptive_polling", default=current.get("adaptive_polling", True)): bool,
+            vol.Optional(
+                "min_interval", default=current.get("min_interval", DEFAULT_MIN_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional(
+                "max_interval", default=current.get("max_interval", DEFAULT_MAX_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional("high_rate", default=current.get("high_rate", False)): bool,
+            vol.Optional(
+                "sample_interval", default=current.get("sample_interval", DEFAULT_SAMPLE_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=60)),
+            vol.Optional(
+                "publish_interval", default=current.get("publish_interval", DEFAULT_PUBLISH_INTERVAL)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=3600)),
+            vol.Optional(
+                "aggregates", default=list(current.get("aggregates", AGGREGATES))
+            ): cv.multi_select({name: name for name in AGGREGATES}),
+            **{
+                vol.Optional(
+                    f"deadband_{name}", default=current.get(f"deadband_{name}", default)
+                ): vol.All(vol.Coerce(float), vol.Range(min=0))
+                for name, default in DEFAULT_DEADBANDS.items()
+            },
+            vol.Optional(
+                "max_age", default=current.get("max_age", DEFAULT_MAX_AGE)
+            ): vol.All(vol.Coerce(int), vol.Range(min=1, max=86400)),
         })
 
-        return self.async_show_form(step_id="init", data_schema=options_schema)
+        return self.async_show_form(step_id="init", data_schema=options_schema, errors=errors)
@@ -0,0 +1,706 @@
+"""Data update coordinators shared between ADA config entries."""
+import asyncio
+import logging
+import time
+from collections import Counter
+from datetime import timedelta
+
+from yarl import URL
+
+from homeassistant.core import callback
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.util import slugify
+
+from .capture import (
+    DEFAULT_MAX_SIZE,
+    DEFAULT_REPLAY_SPEED,
+    PayloadRecorder,
+    ReplaySource,
+    capture_path,
+)
+from .decode import build_converter, build_key_set, convert_snapshot, decode_payload
+from .dsmr import DEFAULT_DSMR_PORT, TelegramParser
+from .metrics import PollMetrics
+from .product_config import (
+    HIGH_RATE_KEYS,
+    PRODUCT_CONFIGS,
+    REFRESH_TIERS,
+    compute_derived,
+    get_product_derived_specs,
+    get_product_sensor_specs,
+    get_product_sensors,
+)
+from .resolver import is_mdns_host
+from .sampling import (
+    AGGREGATES,
+    DEFAULT_PUBLISH_INTERVAL,
+    DEFAULT_SAMPLE_INTERVAL,
+    WINDOW_KEY,
+    HighRateSampler,
+)
+from .scheduler import DEFAULT_MAX_INTERVAL, DEFAULT_MIN_INTERVAL, AdaptiveInterval
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "adap1ii"
+SCAN_INTERVAL = timedelta(seconds=10)
+FIRST_TELEGRAM_TIMEOUT = 15
+STREAM_IDLE_TIMEOUT = 30
+RECONNECT_DELAYS = (1, 2, 5, 10, 30)
+SNAPSHOT_VERSION = 1
+SNAPSHOT_SAVE_DELAY = 60
+# Sent with the merged entry config after options were applied in place
+SIGNAL_ENTRY_UPDATED = f"{DOMAIN}_entry_updated_{{}}"
+
+
+def build_url(config_data):
+    """Return the JSON endpoint of a meter from entry data/options."""
+    if config_data.get("transport") == "replay":
+        return f"replay://{config_data.get('replay_file')}"
+    url = config_data.get("url")
+    if not url:
+        # Empty fields fall back to the defaults of the product, which the config flow probed
+        product = PRODUCT_CONFIGS.get(config_data.get("product_type"), PRODUCT_CONFIGS["ada12"])
+        host = config_data.get("host") or product["host"]
+        port = config_data.get("port") or product["default_port"]
+        url = f"http://{host}:{port}/json"
+    return url
+
+
+def stream_endpoint(config_data):
+    """Return the (host, port) of the raw P1 telegram stream of a meter."""
+    host = config_data.get("host") or URL(build_url(config_data)).host
+    return host, config_data.get("dsmr_port") or DEFAULT_DSMR_PORT
+
+
+def registry_key(config_data):
+    """Return the key under which the coordinator of a meter is shared."""
+    if config_data.get("transport") == "dsmr":
+        host, port = stream_endpoint(config_data)
+        return f"dsmr://{host.lower()}:{port}"
+    if config_data.get("transport") == "replay":
+        return build_url(config_data)
+    return normalize_url(build_url(config_data))
+
+
+def normalize_url(url):
+    """Return a registry key that is equal for equivalent meter URLs."""
+    parsed = URL(url.strip())
+    if not parsed.is_absolute():
+        parsed = URL(f"http://{url.strip()}")
+    host = (parsed.host or "").lower().rstrip(".")
+    path = parsed.path.rstrip("/") or "/"
+    key = f"{parsed.scheme.lower()}://{host}:{parsed.port}{path}"
+    if parsed.query_string:
+        key = f"{key}?{parsed.query_string}"
+    return key
+
+
+class RestoredSnapshot(dict):
+    """Last known payload loaded from disk, never equal to a live one.
+
+    The first live refresh therefore always reaches the entities, even with
+    always_update=False and identical values, so they drop the stale flag.
+    """
+
+    __hash__ = None
+
+    def __eq__(self, other):
+        return self is other
+
+    def __ne__(self, other):
+        return self is not other
+
+
+def snapshot_store(hass, registry_key):
+    """Return the Store holding the last known snapshot of a meter."""
+    return Store(hass, SNAPSHOT_VERSION, f"{DOMAIN}.snapshot.{slugify(registry_key)}")
+
+
+class AdaBaseCoordinator(DataUpdateCoordinator):
+    """Common state of the coordinators shared by config entries."""
+
+    def __init__(self, hass, name, url, update_interval):
+        super().__init__(
+            hass,
+            _LOGGER,
+            config_entry=None,
+            name=name,
+            update_interval=update_interval,
+            # Returning the previous snapshot object skips the entity fan-out
+            always_update=False,
+        )
+        self.url = url
+        self.registry_key = None
+        # Merged data/options of every config entry using this coordinator
+        self.entry_configs = {}
+        # Keys whose value changed in the last refresh, None means "all"
+        self.changed_keys = None
+        self.derived_specs = ()
+        # Payload key -> typed converter, compiled from the product definitions
+        self.converters = {}
+        self.metrics = PollMetrics()
+        # Entity state writes, and those held back by a deadband, by sensor key
+        self.state_writes = 0
+        self.suppressed_writes = Counter()
+        self.setup_lock = asyncio.Lock()
+        self._store = None
+        self._save_pending = False
+
+    @property
+    def users(self):
+        return len(self.entry_configs)
+
+    @property
+    def stale(self):
+        """True while the data is a restored snapshot and not a live reading."""
+        return isinstance(self.data, RestoredSnapshot)
+
+    async def async_restore_snapshot(self):
+        """Load the last known snapshot of the meter, return True if there was one."""
+        self._store = snapshot_store(self.hass, self.registry_key)
+        stored = await self._store.async_load()
+        if not stored or not stored.get("data"):
+            return False
+        self.data = RestoredSnapshot(stored["data"])
+        self.changed_keys = None
+        _LOGGER.debug("Restored %s snapshot saved at %s", self.url, stored.get("saved"))
+        return True
+
+    def _schedule_snapshot_save(self):
+        # async_delay_save restarts its timer on every call, with 1 s updates it would never fire
+        if self._store is not None and not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._snapshot_to_save, SNAPSHOT_SAVE_DELAY)
+
+    def _snapshot_to_save(self):
+        self._save_pending = False
+        return {"url": self.url, "saved": time.time(), "data": dict(self.data or {})}
+
+    def add_entry(self, entry_id, config_data):
+        self.entry_configs[entry_id] = config_data
+        self._entries_changed()
+
+    async def async_move_to(self, key):
+        """Take over the registry key of another meter and drop what belonged to the old one."""
+        # The snapshot of the old meter would only mislead the next restore
+        if self._store is not None:
+            await self._store.async_remove()
+        self.registry_key = key
+        self._store = snapshot_store(self.hass, key)
+        self._save_pending = False
+        self.changed_keys = None
+        self.metrics = PollMetrics()
+
+    def remove_entry(self, entry_id):
+        self.entry_configs.pop(entry_id, None)
+        if self.entry_configs:
+            self._entries_changed()
+
+    def _entries_changed(self):
+        """Recompute settings derived from the entry configs."""
+        derived = {}
+        converters = {}
+        for config in self.entry_configs.values():
+            product_type = config.get("product_type")
+            for spec in get_product_derived_specs(product_type):
+                derived.setdefault(spec.key, spec)
+            for spec in get_product_sensor_specs(product_type):
+                if spec.key not in converters:
+                    converters[spec.key] = build_converter(spec.kind, spec.scale, spec.minimum, spec.maximum)
+        self.derived_specs = tuple(derived.values())
+        self.converters = converters
+
+    @callback
+    def async_update_listeners(self):
+        start = time.perf_counter()
+        super().async_update_listeners()
+        self.metrics.record("fanout", time.perf_counter() - start)
+
+    def _decorate(self, data):
+        """Add the derived metrics to a freshly decoded snapshot."""
+        if self.derived_specs:
+            data.update(compute_derived(data, self.derived_specs))
+        return data
+
+
+class Ada12Coordinator(AdaBaseCoordinator):
+    """Polls one meter URL for every config entry that points at it."""
+
+    transport = "http"
+
+    def __init__(self, hass, client, url):
+        # No timer of its own, the fleet scheduler polls every HTTP meter
+        super().__init__(hass, f"ADA meter {url}", url, None)
+        self.poll_interval = SCAN_INTERVAL.total_seconds()
+        self.adaptive = True
+        self.schedule = AdaptiveInterval(SCAN_INTERVAL.total_seconds())
+        self.fingerprint_hits = 0
+        self.fingerprint_misses = 0
+        self.keys = build_key_set(())
+        # Payload keys by refresh tier
+        self.tier_keys = {}
+        self.sampler = None
+        self.sample_interval = DEFAULT_SAMPLE_INTERVAL
+        # Appends every raw response to a capture file when enabled
+        self.recorder = None
+        self._client = client
+        self._latest = None
+        self._last_body = None
+        self._etag = None
+        self._last_modified = None
+        self._body_version = 0
+        # tier -> (monotonic time, body version) of its last decode
+        self._tier_decoded = {}
+        self._decode_keys = {}
+        # Keys decoded since the last published snapshot
+        self._touched = set()
+
+    def _entries_changed(self):
+        super()._entries_changed()
+        configs = self.entry_configs.values()
+        keys = build_key_set(
+            key
+            for config in configs
+            for key in get_product_sensors(config.get("product_type"))
+        )
+        if keys != self.keys:
+            self.keys = keys
+            # Force a decode of the next response with the new key set
+            self._last_body = self._etag = self._last_modified = None
+            self._latest = None
+        # A key shared by several products refreshes at its fastest tier
+        tier_of = {}
+        for config in configs:
+            for spec in get_product_sensor_specs(config.get("product_type")):
+                current = tier_of.get(spec.key)
+                if spec.key in keys and (current is None or REFRESH_TIERS[spec.tier] < REFRESH_TIERS[current]):
+                    tier_of[spec.key] = spec.tier
+        grouped = {}
+        for key, tier in tier_of.items():
+            grouped.setdefault(tier, set()).add(key)
+        tier_keys = {tier: frozenset(members) for tier, members in grouped.items()}
+        if tier_keys != self.tier_keys or self._latest is None:
+            self.tier_keys = tier_keys
+            self._tier_decoded = {}
+            self._decode_keys = {}
+        self._setup_sampler([config for config in configs if config.get("high_rate")])
+        self._setup_recorder([config for config in configs if config.get("capture")])
+        # The most eager entry wins, shared meters are polled only once anyway
+        self.adaptive = self.sampler is None and all(
+            config.get("adaptive_polling", True) for config in configs
+        )
+        self.schedule.min_interval = min(
+            config.get("min_interval", DEFAULT_MIN_INTERVAL) for config in configs
+        )
+        self.schedule.max_interval = max(
+            min(config.get("max_interval", DEFAULT_MAX_INTERVAL) for config in configs),
+            self.schedule.min_interval,
+        )
+        if self.sampler is not None:
+            self.poll_interval = self.sample_interval
+        elif not self.adaptive:
+            self.poll_interval = SCAN_INTERVAL.total_seconds()
+
+    def set_endpoint(self, config_data):
+        url = build_url(config_data)
+        self.url = url
+        self.name = f"ADA meter {url}"
+        self.schedule = AdaptiveInterval(
+            SCAN_INTERVAL.total_seconds(), self.schedule.min_interval, self.schedule.max_interval
+        )
+        self.poll_interval = SCAN_INTERVAL.total_seconds()
+        self._last_body = self._etag = self._last_modified = None
+        self._latest = None
+        self._tier_decoded = {}
+        self._touched = set()
+
+    def _setup_sampler(self, configs):
+        if not configs:
+            self.sampler = None
+            return
+        self.sample_interval = min(config.get("sample_interval", DEFAULT_SAMPLE_INTERVAL) for config in configs)
+        publish_interval = min(config.get("publish_interval", DEFAULT_PUBLISH_INTERVAL) for config in configs)
+        wanted = {name for config in configs for name in config.get("aggregates", AGGREGATES)}
+        aggregates = tuple(name for name in AGGREGATES if name in wanted)
+        keys = tuple(key for key in HIGH_RATE_KEYS if key in self.keys)
+        sampler = self.sampler
+        if (
+            sampler is None
+            or sampler.keys != keys
+            or sampler.aggregates != aggregates
+            or sampler.publish_interval != publish_interval
+        ):
+            self.sampler = HighRateSampler(keys, publish_interval, aggregates=aggregates)
+
+    def _setup_recorder(self, configs):
+        path = capture_path(self.hass, self.registry_key) if configs else None
+        recorder = self.recorder
+        if recorder is not None and recorder.path != path:
+            self.hass.async_create_background_task(recorder.async_close(), f"{DOMAIN} close {recorder.path}")
+            recorder = None
+        if recorder is None and path is not None:
+            recorder = PayloadRecorder(
+                self.hass, path, max(config.get("capture_max_size", DEFAULT_MAX_SIZE) for config in configs)
+            )
+        self.recorder = recorder
+
+    async def _async_update_data(self):
+        url = self.url
+        try:
+            result = await self._client.async_fetch(url, self._etag, self._last_modified)
+        except Exception as err:
+            self.metrics.failure(err)
+            if self.recorder is not None:
+                self.recorder.add(time.time(), error=err)
+            raise UpdateFailed(f"Error fetching data from {url}: {err}") from err
+        if url != self.url:
+            # The endpoint was reconfigured during the fetch, drop the old meter's answer
+            return self.data
+        self.metrics.record_fetch(result.timings, len(result.body or b""))
+        if self.recorder is not None:
+            self.recorder.add(time.time(), result.body, result.timings.get("total"), result.not_modified)
+
+        if not result.not_modified and result.body != self._last_body:
+            self._last_body = result.body
+            self._body_version += 1
+            self._etag = result.etag
+            self._last_modified = result.last_modified
+        stale_tiers = self._stale_tiers(time.monotonic())
+        if self._latest is not None and not stale_tiers:
+            # Same bytes as last time, or only tiers that are not due yet
+            # changed: no decode, no diff, no entity updates
+            self.fingerprint_hits += 1
+            data = self._latest
+            fresh = False
+        else:
+            self.fingerprint_misses += 1
+            start = time.perf_counter()
+            try:
+                decoded = convert_snapshot(
+                    decode_payload(self._last_body, self._tier_key_set(stale_tiers)), self.converters
+                )
+            except ValueError as err:
+                self.metrics.failure(err)
+                raise UpdateFailed(f"Invalid JSON from {self.url}: {err}") from err
+            if self._latest is not None:
+                decoded = {**self._latest, **decoded}
+            data = self._decorate(decoded)
+            self.metrics.record("decode", time.perf_counter() - start)
+            now = time.monotonic()
+            for tier in stale_tiers:
+                self._tier_decoded[tier] = (now, self._body_version)
+            self._touched.update(decoded)
+            self._latest = data
+            fresh = True
+        self.metrics.success()
+        if self.adaptive:
+            self.poll_interval = self.schedule.observe(data.get("timestamp"))
+
+        if self.sampler is not None:
+            now = time.time()
+            if fresh:
+                self.sampler.add(data, now)
+            if self.data is not None and not self.stale and not self.sampler.window_due(now):
+                # Keep sampling, entities only hear about closed windows
+                self.changed_keys = frozenset()
+                return self.data
+            data = {**data, WINDOW_KEY: self.sampler.close_window(now)}
+        elif not fresh:
+            self.changed_keys = frozenset()
+            return self.data
+
+        # Only keys decoded since the last publish can differ, plus the derived ones
+        keys = None
+        if not self.stale:
+            keys = self._touched | {spec.key for spec in self.derived_specs} | {WINDOW_KEY}
+        self.changed_keys = diff_snapshots(self.data, data, keys)
+        self._touched = set()
+        self._schedule_snapshot_save()
+        return data
+
+    def _stale_tiers(self, now):
+        """Return the tiers that are due and were decoded from an older body."""
+        stale = []
+        for tier in self.tier_keys:
+            decoded = self._tier_decoded.get(tier)
+            if decoded is None or (
+                decoded[1] != self._body_version and now - decoded[0] >= REFRESH_TIERS[tier]
+            ):
+                stale.append(tier)
+        return frozenset(stale)
+
+    def _tier_key_set(self, tiers):
+        keys = self._decode_keys.get(tiers)
+        if keys is None:
+            keys = self._decode_keys[tiers] = build_key_set(
+                key for tier in tiers for key in self.tier_keys[tier]
+            )
+        return keys
+
+    async def async_shutdown(self):
+        await super().async_shutdown()
+        if self.recorder is not None:
+            await self.recorder.async_close()
+            self.recorder = None
+
+
+class Ada12ReplayCoordinator(Ada12Coordinator):
+    """Feeds a capture file through the poll pipeline at the pace it was recorded.
+
+    Every captured response goes through the same fingerprinting, decoding,
+    diffing and entity fan-out as a live one. ``speed`` scales the pauses
+    between responses, 0 replays as fast as the pipeline allows, which
+    makes a replay entry an offline benchmark of the update path.
+    """
+
+    transport = "replay"
+
+    def __init__(self, hass, path, speed=DEFAULT_REPLAY_SPEED, repeat=False):
+        self.source = ReplaySource(hass, path)
+        super().__init__(hass, self.source, f"replay://{path}")
+        self.speed = speed
+        self.repeat = repeat
+        self.replayed = 0
+        self._task = None
+
+    def _entries_changed(self):
+        super()._entries_changed()
+        configs = self.entry_configs.values()
+        self.speed = min(config.get("replay_speed", DEFAULT_REPLAY_SPEED) for config in configs)
+        self.repeat = any(config.get("replay_repeat") for config in configs)
+        # The pace comes from the capture, not from the schedule
+        self.adaptive = False
+
+    def _setup_recorder(self, configs):
+        # Capturing a replay would only copy its file
+        self.recorder = None
+
+    async def async_restore_snapshot(self):
+        # A replay starts from its first response, not from where the last one stopped
+        return False
+
+    async def _async_update_data(self):
+        if self._task is None:
+            try:
+                self.source.current = await self.source.async_next()
+            except OSError as err:
+                raise UpdateFailed(f"Cannot read {self.source.path}: {err}") from err
+            if self.source.current is None:
+                raise UpdateFailed(f"Nothing to replay in {self.source.path}")
+            self._task = self.hass.async_create_background_task(
+                self._async_run(), f"{DOMAIN} replay {self.source.path}"
+            )
+        return await super()._async_update_data()
+
+    async def _async_run(self):
+        previous = self.source.current["t"]
+        started = time.monotonic()
+        while True:
+            try:
+                record = await self.source.async_next()
+            except OSError as err:
+                _LOGGER.error("Replay of %s stopped: %s", self.source.path, err)
+                return
+            if record is None:
+                _LOGGER.info(
+                    "Replayed %s responses of %s in %.1f s",
+                    self.replayed + 1, self.source.path, time.monotonic() - started,
+                )
+                if not self.repeat:
+                    return
+                await self.source.async_rewind()
+                previous = None
+                continue
+            if self.speed and previous is not None:
+                await asyncio.sleep(max(record["t"] - previous, 0) / self.speed)
+            else:
+                # Let the entity writes and everything else on the loop run
+                await asyncio.sleep(0)
+            previous = record["t"]
+            self.source.current = record
+            await self.async_refresh()
+            self.replayed += 1
+
+    async def async_shutdown(self):
+        await super().async_shutdown()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.source.async_close()
+
+
+def diff_snapshots(old, new, keys=None):
+    """Return the keys that differ between two payloads (None if there is no previous one).
+
+    With ``keys`` only those keys are compared.
+    """
+    if old is None:
+        return None
+    if keys is not None:
+        return frozenset(key for key in keys if old.get(key) != new.get(key))
+    changed = {key for key, value in new.items() if key not in old or old[key] != value}
+    changed.update(old.keys() - new.keys())
+    return frozenset(changed)
+
+
+class Ada12StreamCoordinator(AdaBaseCoordinator):
+    """Pushes every telegram of a persistent P1 TCP stream to the entities."""
+
+    transport = "dsmr"
+
+    def __init__(self, hass, host, port, resolver=None):
+        super().__init__(hass, f"ADA P1 stream {host}:{port}", f"dsmr://{host}:{port}", None)
+        self.host = host
+        self.port = port
+        self._resolver = resolver
+        self.parser = TelegramParser()
+        self._task = None
+        self._first_telegram = asyncio.Event()
+
+    def set_endpoint(self, config_data):
+        self.host, self.port = stream_endpoint(config_data)
+        self.url = f"dsmr://{self.host}:{self.port}"
+        self.name = f"ADA P1 stream {self.host}:{self.port}"
+        self.parser = TelegramParser()
+        if self._task is not None:
+            self._task.cancel()
+            self._start_stream()
+
+    def _start_stream(self):
+        self._task = self.hass.async_create_background_task(
+            self._async_run(), f"{DOMAIN} stream {self.host}:{self.port}"
+        )
+
+    async def _async_update_data(self):
+        """Start the stream and wait for its first telegram; later calls return the latest one."""
+        if self._task is None:
+            self._start_stream()
+        try:
+            async with asyncio.timeout(FIRST_TELEGRAM_TIMEOUT):
+                await self._first_telegram.wait()
+        except TimeoutError as err:
+            raise UpdateFailed(f"No telegram received from {self.url}") from err
+        return self.data
+
+    async def _async_run(self):
+        attempt = 0
+        while True:
+            address = None
+            if self._resolver is not None and is_mdns_host(self.host):
+                address = await self._resolver.async_resolve(self.host)
+            try:
+                reader, writer = await asyncio.open_connection(address or self.host, self.port)
+            except OSError as err:
+                if address is not None:
+                    self._resolver.invalidate(self.host)
+                self._async_stream_error(err)
+            else:
+                attempt = 0
+                try:
+                    while chunk := await asyncio.wait_for(reader.read(4096), STREAM_IDLE_TIMEOUT):
+                        for telegram in self.parser.feed(chunk):
+                            self._async_push(telegram)
+                    self._async_stream_error(ConnectionError("Stream closed by meter"))
+                except OSError as err:
+                    self._async_stream_error(err)
+                finally:
+                    writer.close()
+            await asyncio.sleep(RECONNECT_DELAYS[min(attempt, len(RECONNECT_DELAYS) - 1)])
+            attempt += 1
+
+    def _async_push(self, telegram):
+        self.metrics.success()
+        telegram = self._decorate(convert_snapshot(telegram, self.converters))
+        self.changed_keys = diff_snapshots(self.data, telegram)
+        self._first_telegram.set()
+        self._schedule_snapshot_save()
+        self.async_set_updated_data(telegram)
+
+    def _async_stream_error(self, err):
+        _LOGGER.debug("P1 stream %s failed: %s", self.url, err)
+        self.metrics.failure(err)
+        if self.last_update_success:
+            self.async_set_update_error(err)
+
+    async def async_shutdown(self):
+        await super().async_shutdown()
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+async def async_acquire_coordinator(hass, entry_id, config_data):
+    """Return the coordinator of a meter, creating and refreshing it if needed."""
+    domain_data = hass.data[DOMAIN]
+    registry = domain_data.setdefault("coordinators", {})
+    key = registry_key(config_data)
+    coordinator = registry.get(key)
+    if coordinator is None:
+        if config_data.get("transport") == "dsmr":
+            coordinator = Ada12StreamCoordinator(
+                hass, *stream_endpoint(config_data), resolver=domain_data["client"].resolver
+            )
+        elif config_data.get("transport") == "replay":
+            coordinator = Ada12ReplayCoordinator(hass, config_data["replay_file"])
+        else:
+            coordinator = Ada12Coordinator(hass, domain_data["client"], build_url(config_data))
+        coordinator.registry_key = key
+        registry[key] = coordinator
+    coordinator.add_entry(entry_id, config_data)
+
+    restored = False
+    async with coordinator.setup_lock:
+        if coordinator.data is None:
+            restored = await coordinator.async_restore_snapshot()
+            if not restored:
+                await coordinator.async_refresh()
+    # Entities start from the last known values, the live fetch runs in the background
+    if coordinator.transport == "http":
+        # The scheduler runs it, so a scheduled poll cannot overlap it
+        domain_data["scheduler"].add(coordinator, poll_now=restored)
+    elif restored:
+        hass.async_create_background_task(coordinator.async_refresh(), f"{DOMAIN} first refresh {coordinator.url}")
+    return coordinator
+
+
+async def async_reconfigure_coordinator(hass, entry_id, coordinator, config_data):
+    """Apply changed entry settings to a running coordinator.
+
+    Interval, product and sampling changes only recompute the derived
+    settings. A new endpoint is swapped in place when the entry is the only
+    user of the coordinator and keeps its transport. Returns False when the
+    change needs a reload of the entry instead: another transport, or a
+    meter that is, or becomes, shared with other entries.
+    """
+    domain_data = hass.data[DOMAIN]
+    registry = domain_data["coordinators"]
+    key = registry_key(config_data)
+    if config_data.get("transport", "http") != coordinator.transport:
+        return False
+    if key != coordinator.registry_key:
+        # A replay restarts from the top of the new file anyway
+        if coordinator.users > 1 or key in registry or coordinator.transport == "replay":
+            return False
+        _LOGGER.debug("Moving %s to %s", coordinator.url, key)
+        registry.pop(coordinator.registry_key, None)
+        registry[key] = coordinator
+        await coordinator.async_move_to(key)
+        coordinator.set_endpoint(config_data)
+    coordinator.add_entry(entry_id, config_data)
+    if coordinator.transport == "http":
+        # A shorter interval or a new endpoint should not wait for the old due time
+        domain_data["scheduler"].reschedule(coordinator)
+    return True
+
+
+async def async_release_coordinator(hass, entry_id, coordinator):
+    """Drop one reference; the last user shuts the coordinator down."""
+    coordinator.remove_entry(entry_id)
+    if coordinator.users > 0:
+        return
+    registry = hass.data[DOMAIN].get("coordinators", {})
+    registry.pop(coordinator.registry_key, None)
+    hass.data[DOMAIN]["scheduler"].remove(coordinator)
+    await coordinator.async_shutdown()
@@ -0,0 +1,72 @@
+"""Payload decoding for ADA meters."""
+import math
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # pragma: no cover - orjson ships with Home Assistant
+    from json import loads as json_loads
+
+# Needed by the coordinator itself, whichever sensors are configured
+ALWAYS_KEPT = frozenset({"timestamp"})
+# Placeholders some firmwares send instead of leaving a value out
+NULL_STRINGS = frozenset({"", "-", "--", "null", "none", "nan", "n/a"})
+
+
+def build_key_set(sensor_keys):
+    """Return the set of payload keys to keep for the given sensor keys."""
+    return frozenset(sensor_keys) | ALWAYS_KEPT
+
+
+def decode_payload(body, keys):
+    """Decode a raw JSON body, keeping only ``keys``.
+
+    Everything else the meter sends (credentials, Wi-Fi and OS details)
+    is dropped right away instead of living on in ``coordinator.data``.
+    """
+    payload = json_loads(body)
+    if not isinstance(payload, dict):
+        raise ValueError(f"Expected a JSON object, got {type(payload).__name__}")
+    return {key: payload[key] for key in keys if key in payload}
+
+
+def build_converter(kind, scale=1.0, minimum=None, maximum=None):
+    """Return a function turning a raw payload value into its typed form.
+
+    Numbers are scaled to the sensor unit; unparsable values, placeholders
+    and readings outside ``minimum``/``maximum`` become None.
+    """
+    if kind == "text":
+        def convert_text(value):
+            if value is None:
+                return None
+            text = str(value).strip()
+            return None if text.lower() in NULL_STRINGS else text
+        return convert_text
+
+    def convert_number(value):
+        if value is None or isinstance(value, bool):
+            return None
+        if not isinstance(value, (int, float)):
+            text = str(value).strip()
+            if text.lower() in NULL_STRINGS:
+                return None
+            try:
+                value = float(text)
+            except ValueError:
+                return None
+        if scale != 1.0:
+            value *= scale
+        if not math.isfinite(value):
+            return None
+        if (minimum is not None and value < minimum) or (maximum is not None and value > maximum):
+            return None
+        return value
+    return convert_number
+
+
+def convert_snapshot(data, converters):
+    """Apply the per-key converters to a decoded payload, once per update."""
+    return {
+        key: converter(value) if (converter := converters.get(key)) is not None else value
+        for key, value in data.items()
+    }
@@ -0,0 +1,73 @@
+"""Diagnostics support for ADA meters."""
+from homeassistant.components.diagnostics import async_redact_data
+
+from .aggregate import is_aggregate_entry
+
+DOMAIN = "adap1ii"
+
+# Credentials and network details some meters put in their payload
+TO_REDACT = {"username", "password", "wifi_ssid", "local_ip", "mac_address", "client_id"}
+
+
+async def async_get_config_entry_diagnostics(hass, entry):
+    """Return diagnostics for a config entry."""
+    domain_data = hass.data[DOMAIN]
+    if is_aggregate_entry(entry):
+        aggregator = domain_data["aggregates"][entry.entry_id]
+        return {
+            "entry": {"data": dict(entry.data), "options": dict(entry.options)},
+            "aggregate": {
+                "meters": list(aggregator.meter_ids),
+                "live_meters": sorted(aggregator.live),
+                "updates": aggregator.updates,
+                "contributions": aggregator.contributions,
+                "totals": aggregator.data,
+            },
+        }
+    coordinator = domain_data["entries"][entry.entry_id]
+
+    coordinator_info = {
+        "url": coordinator.url,
+        "shared_with_entries": coordinator.users,
+        "last_update_success": coordinator.last_update_success,
+        "poll_interval": getattr(coordinator, "poll_interval", None),
+    }
+    if hasattr(coordinator, "fingerprint_hits"):
+        total = coordinator.fingerprint_hits + coordinator.fingerprint_misses
+        coordinator_info["fingerprint"] = {
+            "unchanged_responses": coordinator.fingerprint_hits,
+            "changed_responses": coordinator.fingerprint_misses,
+            "unchanged_ratio": round(coordinator.fingerprint_hits / total, 3) if total else None,
+        }
+    recorder = getattr(coordinator, "recorder", None)
+    if recorder is not None:
+        coordinator_info["capture"] = {
+            "path": recorder.path,
+            "records": recorder.records,
+            "rotations": recorder.rotations,
+        }
+    if getattr(coordinator, "transport", None) == "replay":
+        coordinator_info["replay"] = {
+            "path": coordinator.source.path,
+            "speed": coordinator.speed,
+            "replayed": coordinator.replayed,
+        }
+    coordinator_info["poll_metrics"] = coordinator.metrics.summary()
+    suppressed = sum(coordinator.suppressed_writes.values())
+    attempts = coordinator.state_writes + suppressed
+    coordinator_info["deadband"] = {
+        "state_writes": coordinator.state_writes,
+        "suppressed_writes": suppressed,
+        "suppressed_ratio": round(suppressed / attempts, 3) if attempts else None,
+        "suppressed_by_sensor": dict(coordinator.suppressed_writes.most_common()),
+    }
+
+    client = domain_data.get("client")
+    return {
+        "entry": {"data": dict(entry.data), "options": dict(entry.options)},
+        "coordinator": coordinator_info,
+        "connections": dict(client.stats) if client else {},
+        "resolver": client.resolver.stats() if client else {},
+        "scheduler": domain_data["scheduler"].stats(),
+        "data": async_redact_data(coordinator.data or {}, TO_REDACT),
+    }
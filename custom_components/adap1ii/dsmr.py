@@ -0,0 +1,121 @@
+"""Incremental DSMR/P1 telegram parser and TCP stream reader."""
+import asyncio
+import logging
+import re
+
+from .product_config import OBIS_CODES
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_DSMR_PORT = 8088
+# A full Hungarian P1 telegram is ~1.5 kB, anything much larger is garbage
+MAX_TELEGRAM_SIZE = 16384
+
+_LINE_RE = re.compile(rb"^(\d+-\d+:\d+\.\d+\.\d+)((?:\([^)]*\))+)", re.MULTILINE)
+
+
+def _build_crc_table():
+    table = []
+    for byte in range(256):
+        crc = byte
+        for _ in range(8):
+            crc = (crc >> 1) ^ 0xA001 if crc & 1 else crc >> 1
+        table.append(crc)
+    return tuple(table)
+
+
+_CRC_TABLE = _build_crc_table()
+
+
+def crc16(data):
+    """CRC-16/ARC as used by DSMR 4+ telegrams."""
+    crc = 0
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xFF]
+    return crc
+
+
+def _parse_value(raw):
+    value, _, unit = raw.partition("*")
+    if unit or "." in value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    return value
+
+
+def parse_telegram(telegram, obis_codes=OBIS_CODES):
+    """Map the OBIS lines of a telegram to sensor keys."""
+    data = {}
+    for match in _LINE_RE.finditer(telegram):
+        key = obis_codes.get(match.group(1).decode("ascii"))
+        if key is None:
+            continue
+        # Lines like the gas reading carry several groups, the value is the last one
+        raw = match.group(2).rsplit(b"(", 1)[1][:-1]
+        data[key] = _parse_value(raw.decode("ascii", "replace"))
+    return data
+
+
+class TelegramParser:
+    """Splits a byte stream into CRC-checked telegrams."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self.telegrams = 0
+        self.crc_errors = 0
+
+    def feed(self, chunk):
+        """Add received bytes and return the decoded telegrams completed by them."""
+        buffer = self._buffer
+        buffer += chunk
+        decoded = []
+        while True:
+            start = buffer.find(b"/")
+            if start < 0:
+                buffer.clear()
+                break
+            if start:
+                del buffer[:start]
+            end = buffer.find(b"!")
+            if end < 0:
+                if len(buffer) > MAX_TELEGRAM_SIZE:
+                    buffer.clear()
+                break
+            eol = buffer.find(b"\n", end)
+            if eol < 0:
+                break
+            telegram = bytes(buffer[:end + 1])
+            checksum = bytes(buffer[end + 1:eol]).strip()
+            del buffer[:eol + 1]
+            # DSMR 2.2/3.0 telegrams carry no CRC
+            if checksum:
+                try:
+                    valid = int(checksum, 16) == crc16(telegram)
+                except ValueError:
+                    valid = False
+                if not valid:
+                    self.crc_errors += 1
+                    continue
+            self.telegrams += 1
+            decoded.append(parse_telegram(telegram))
+        return decoded
+
+
+async def async_read_telegram(host, port, timeout=10):
+    """Connect to a P1 stream and return the first valid telegram."""
+    async with asyncio.timeout(timeout):
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            parser = TelegramParser()
+            while True:
+                chunk = await reader.read(4096)
+                if not chunk:
+                    raise ConnectionError("Stream closed by meter")
+                telegrams = parser.feed(chunk)
+                if telegrams:
+                    return telegrams[0]
+        finally:
+            writer.close()
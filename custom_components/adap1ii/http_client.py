@@ -0,0 +1,149 @@
+"""Shared, pooled HTTP client for ADA meter polls."""
+import logging
+import time
+from collections import namedtuple
+
+import aiohttp
+from yarl import URL
+
+from homeassistant.const import __version__ as HA_VERSION
+
+from .resolver import MeterResolver
+
+_LOGGER = logging.getLogger(__name__)
+
+REQUEST_TIMEOUT = 10
+# The ESP based meters only serve a couple of sockets at once.
+LIMIT_PER_HOST = 2
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+
+# timings holds the seconds spent in dns, connect, first_byte and total
+FetchResult = namedtuple("FetchResult", "body etag last_modified not_modified timings")
+
+
+class AdaHttpClient:
+    """One keep-alive connection pool shared by every meter of the integration."""
+
+    def __init__(self, hass):
+        self._hass = hass
+        self._session = None
+        self._users = 0
+        self.stats = {}
+        self.resolver = MeterResolver(hass)
+
+    def acquire(self):
+        """Register a config entry as a user of the client."""
+        self._users += 1
+
+    async def async_release(self):
+        """Drop a user; the pool is closed when the last entry unloads."""
+        self._users = max(self._users - 1, 0)
+        if self._users == 0 and self._session is not None:
+            await self._session.close()
+            self._session = None
+        return self._users
+
+    @property
+    def session(self):
+        """Return the pooled session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            trace = aiohttp.TraceConfig()
+            trace.on_request_start.append(self._on_request_start)
+            trace.on_connection_create_end.append(self._on_connection_create)
+            trace.on_connection_reuseconn.append(self._on_connection_reuse)
+            trace.on_dns_resolvehost_start.append(self._on_dns_start)
+            trace.on_dns_resolvehost_end.append(self._on_dns_end)
+            trace.on_connection_create_start.append(self._on_connection_create_start)
+            trace.on_request_end.append(self._on_request_end)
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit_per_host=LIMIT_PER_HOST,
+                    keepalive_timeout=KEEPALIVE_TIMEOUT,
+                    ttl_dns_cache=DNS_CACHE_TTL,
+                ),
+                timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT),
+                headers={"User-Agent": f"HomeAssistant/{HA_VERSION} adap1ii"},
+                trace_configs=[trace],
+            )
+        return self._session
+
+    async def async_fetch(self, url, etag=None, last_modified=None):
+        """Fetch the raw payload of a meter, conditionally if validators are known."""
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        timings = {}
+        start = time.perf_counter()
+        # .local names are resolved once, not by mDNS on every poll
+        target, host_header = await self.resolver.async_resolve_url(url)
+        if host_header is not None:
+            headers["Host"] = host_header
+        try:
+            async with self.session.get(target, headers=headers, trace_request_ctx=timings) as response:
+                if response.status == 304:
+                    timings["total"] = time.perf_counter() - start
+                    return FetchResult(None, etag, last_modified, True, timings)
+                if response.status != 200:
+                    raise aiohttp.ClientResponseError(
+                        response.request_info,
+                        response.history,
+                        status=response.status,
+                        message=f"HTTP {response.status}",
+                    )
+                body = await response.read()
+                timings["total"] = time.perf_counter() - start
+                return FetchResult(
+                    body,
+                    response.headers.get("ETag"),
+                    response.headers.get("Last-Modified"),
+                    False,
+                    timings,
+                )
+        except (aiohttp.ClientConnectionError, TimeoutError):
+            if host_header is not None:
+                # The meter may have a new DHCP lease, look it up again next time
+                self.resolver.invalidate(URL(url).host)
+            raise
+
+    def _host_stats(self, host):
+        stats = self.stats.get(host)
+        if stats is None:
+            stats = self.stats[host] = {
+                "requests": 0,
+                "new_connections": 0,
+                "reused_connections": 0,
+            }
+        return stats
+
+    async def _on_request_start(self, session, ctx, params):
+        ctx.host = params.url.host
+        ctx.start = time.perf_counter()
+        self._host_stats(ctx.host)["requests"] += 1
+
+    async def _on_connection_create_start(self, session, ctx, params):
+        ctx.connect_start = time.perf_counter()
+
+    async def _on_connection_create(self, session, ctx, params):
+        self._host_stats(getattr(ctx, "host", None))["new_connections"] += 1
+        if ctx.trace_request_ctx is not None:
+            # Name resolution happens inside the connection setup, count it once
+            elapsed = time.perf_counter() - ctx.connect_start
+            ctx.trace_request_ctx["connect"] = elapsed - ctx.trace_request_ctx.get("dns", 0)
+
+    async def _on_connection_reuse(self, session, ctx, params):
+        self._host_stats(getattr(ctx, "host", None))["reused_connections"] += 1
+
+    async def _on_dns_start(self, session, ctx, params):
+        ctx.dns_start = time.perf_counter()
+
+    async def _on_dns_end(self, session, ctx, params):
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["dns"] = time.perf_counter() - ctx.dns_start
+
+    async def _on_request_end(self, session, ctx, params):
+        # Fired once the response headers are in
+        if ctx.trace_request_ctx is not None:
+            ctx.trace_request_ctx["first_byte"] = time.perf_counter() - ctx.start
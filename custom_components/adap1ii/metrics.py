@@ -0,0 +1,100 @@
+"""Rolling poll pipeline metrics of ADA meters."""
+import socket
+import time
+from collections import Counter, deque
+
+import aiohttp
+
+# dns and connect only occur when a new connection is opened
+STAGES = ("dns", "connect", "first_byte", "total", "decode", "fanout")
+WINDOW = 200
+# Histogram bucket upper bounds in milliseconds
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def failure_category(err):
+    """Return a short category of a poll or stream error."""
+    if isinstance(err, TimeoutError):
+        return "timeout"
+    if isinstance(err, aiohttp.ClientConnectorError):
+        return "dns" if isinstance(err.os_error, socket.gaierror) else "connect"
+    if isinstance(err, aiohttp.ClientResponseError):
+        return f"http_{err.status}"
+    if isinstance(err, (aiohttp.ClientConnectionError, OSError)):
+        return "connection"
+    if isinstance(err, ValueError):
+        return "invalid_payload"
+    return "other"
+
+
+def _percentile(ordered, share):
+    return ordered[min(int(len(ordered) * share), len(ordered) - 1)]
+
+
+class PollMetrics:
+    """Keeps the last ``window`` timings of every pipeline stage of one meter."""
+
+    def __init__(self, window=WINDOW):
+        self.stages = {stage: deque(maxlen=window) for stage in STAGES}
+        self.payload_bytes = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        # Failures since startup, by category
+        self.failures = Counter()
+        self.last_failure = None
+
+    def record(self, stage, seconds):
+        self.stages[stage].append(seconds)
+
+    def record_fetch(self, timings, size):
+        for stage, seconds in timings.items():
+            self.stages[stage].append(seconds)
+        self.payload_bytes.append(size)
+
+    def success(self):
+        self.outcomes.append(True)
+
+    def failure(self, err):
+        category = failure_category(err)
+        self.failures[category] += 1
+        self.outcomes.append(False)
+        self.last_failure = {"category": category, "error": str(err), "time": time.time()}
+
+    def latency_ms(self):
+        """Median total fetch time of the window."""
+        samples = self.stages["total"]
+        if not samples:
+            return None
+        return round(_percentile(sorted(samples), 0.5) * 1000, 1)
+
+    def success_percent(self):
+        if not self.outcomes:
+            return None
+        return round(sum(self.outcomes) / len(self.outcomes) * 100, 1)
+
+    def summary(self):
+        """Return percentiles and histograms of every stage."""
+        stages = {}
+        for stage, samples in self.stages.items():
+            if not samples:
+                continue
+            ordered = sorted(value * 1000 for value in samples)
+            histogram = dict.fromkeys([f"<={bound}ms" for bound in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"], 0)
+            for value in ordered:
+                bound = next((bound for bound in BUCKETS_MS if value <= bound), None)
+                histogram[f"<={bound}ms" if bound is not None else f">{BUCKETS_MS[-1]}ms"] += 1
+            stages[stage] = {
+                "count": len(ordered),
+                "mean_ms": round(sum(ordered) / len(ordered), 2),
+                "p50_ms": round(_percentile(ordered, 0.5), 2),
+                "p95_ms": round(_percentile(ordered, 0.95), 2),
+                "max_ms": round(ordered[-1], 2),
+                "histogram": histogram,
+            }
+        sizes = self.payload_bytes
+        return {
+            "stages": stages,
+            "payload_bytes": {"mean": round(sum(sizes) / len(sizes)), "max": max(sizes)} if sizes else None,
+            "success_percent": self.success_percent(),
+            "failures": dict(self.failures),
+            "last_failure": self.last_failure,
+        }
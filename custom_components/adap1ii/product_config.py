@@ -1,10 +1,83 @@
 """Product configuration for ADA family devices."""
+from dataclasses import dataclass
 
 # Product definitions with their supported sensors
 # ignored entries pziot-e02: username, password, wifi_ssid, local_ip, os_version, mac_address, cosem_logical_device_name,
 # ignored entries ada one: username, password, os_version, local_ip, cosem_logical_device_name, client_id, current_tariff, timestamp
 #mod
 
+# Derived metrics, computed once per update from the decoded snapshot
+NET_POWER = {
+    "net_power": {
+        "op": "difference",
+        "inputs": ["instantaneous_power_import", "instantaneous_power_export"],
+        "unit": "kW",
+        "friendly_name": "Nettó teljesítmény",
+        "icon": "mdi:transmission-tower",
+        "state_class": "measurement"
+    },
+}
+THREE_PHASE_DERIVED = {
+    "total_current": {
+        "op": "sum",
+        "inputs": ["current_phase_l1", "current_phase_l2", "current_phase_l3"],
+        "unit": "A",
+        "friendly_name": "Összes áramerősség",
+        "icon": "mdi:current-ac",
+        "state_class": "measurement"
+    },
+    "apparent_power_l1": {
+        "op": "product",
+        "inputs": ["voltage_phase_l1", "current_phase_l1"],
+        "scale": 0.001,
+        "unit": "kVA",
+        "friendly_name": "Látszólagos teljesítmény L1",
+        "icon": "mdi:flash-outline",
+        "state_class": "measurement"
+    },
+    "apparent_power_l2": {
+        "op": "product",
+        "inputs": ["voltage_phase_l2", "current_phase_l2"],
+        "scale": 0.001,
+        "unit": "kVA",
+        "friendly_name": "Látszólagos teljesítmény L2",
+        "icon": "mdi:flash-outline",
+        "state_class": "measurement"
+    },
+    "apparent_power_l3": {
+        "op": "product",
+        "inputs": ["voltage_phase_l3", "current_phase_l3"],
+        "scale": 0.001,
+        "unit": "kVA",
+        "friendly_name": "Látszólagos teljesítmény L3",
+        "icon": "mdi:flash-outline",
+        "state_class": "measurement"
+    },
+    "phase_imbalance": {
+        "op": "imbalance",
+        "inputs": ["current_phase_l1", "current_phase_l2", "current_phase_l3"],
+        "unit": "%",
+        "friendly_name": "Fázis aszimmetria",
+        "icon": "mdi:scale-unbalanced",
+        "state_class": "measurement"
+    },
+}
+REACTIVE_POWER_TOTAL = {
+    "reactive_power_total": {
+        "op": "sum",
+        "inputs": [
+            "instantaneous_reactive_power_qi",
+            "instantaneous_reactive_power_qii",
+            "instantaneous_reactive_power_qiii",
+            "instantaneous_reactive_power_qiv",
+        ],
+        "unit": "kVAr",
+        "friendly_name": "Összes reaktív teljesítmény",
+        "icon": "mdi:sine-wave",
+        "state_class": "measurement"
+    },
+}
+
 PRODUCT_CONFIGS = {
     "ada12": {
         "name": "ADA P1 Meter",
@@ -36,74 +109,88 @@ PRODUCT_CONFIGS = {
         "active_import_energy_tariff_1": {
             "unit": "kWh",
             "friendly_name": "Importált energia tarifa 1",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_import_energy_tariff_2": {
             "unit": "kWh",
             "friendly_name": "Importált energia tarifa 2",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_import_energy_tariff_3": {
             "unit": "kWh",
             "friendly_name": "Importált energia tarifa 3",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_import_energy_tariff_4": {
             "unit": "kWh",
             "friendly_name": "Importált energia tarifa 4",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_export_energy_tariff_1": {
             "unit": "kWh",
             "friendly_name": "Exportált energia tarifa 1",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_export_energy_tariff_2": {
             "unit": "kWh",
             "friendly_name": "Exportált energia tarifa 2",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_export_energy_tariff_3": {
             "unit": "kWh",
             "friendly_name": "Exportált energia tarifa 3",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
         "active_export_energy_tariff_4": {
             "unit": "kWh",
             "friendly_name": "Exportált energia tarifa 4",
-            "icon": "mdi:counter"
+            "icon": "mdi:counter",
+            "state_class": "total_increasing"
         },
 
         # Reaktív energia (kVArh)
         "reactive_import_energy": {
             "unit": "kVArh",
             "friendly_name": "Reaktív importált energia",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
         "reactive_export_energy": {
             "unit": "kVArh",
             "friendly_name": "Reaktív exportált energia",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
         "reactive_energy_qi": {
             "unit": "kVArh",
             "friendly_name": "Reaktív energia QI",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
         "reactive_energy_qii": {
             "unit": "kVArh",
             "friendly_name": "Reaktív energia QII",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
         "reactive_energy_qiii": {
             "unit": "kVArh",
             "friendly_name": "Reaktív energia QIII",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
         "reactive_energy_qiv": {
             "unit": "kVArh",
             "friendly_name": "Reaktív energia QIV",
-            "icon": "mdi:sine-wave"
+            "icon": "mdi:sine-wave",
+            "state_class": "total_increasing"
         },
 
         # Pillanatnyi teljesítmény
@@ -268,14 +355,17 @@ PRODUCT_CONFIGS = {
         "current_tariff": {
             "unit": "",
             "friendly_name": "Aktív tarifa",
-            "icon": "mdi:calendar"
+            "icon": "mdi:calendar",
+            "tier": "counter"
         },
         "timestamp": {
             "unit": "",
             "friendly_name": "Időbélyeg",
-            "icon": "mdi:clock-outline"
+            "icon": "mdi:clock-outline",
+            "tier": "fast"
         }
-    }
+    },
+        "derived": {**NET_POWER, **THREE_PHASE_DERIVED, **REACTIVE_POWER_TOTAL}
     },
     "adaone": {
         "name": "ADA One",
@@ -387,7 +477,8 @@ PRODUCT_CONFIGS = {
                 "friendly_name": "Mérő sorozatszáma",
                 "icon": "mdi:identifier"
             }
-        }
+        },
+        "derived": {**NET_POWER, **THREE_PHASE_DERIVED}
     },
     "adabridge": {
         "name": "ADA Bridge",
@@ -417,6 +508,9 @@ PRODUCT_CONFIGS = {
                 "icon": "mdi:flash",
                 "state_class": "measurement"
             }
+        },
+        "derived": {
+            "apparent_power_l1": THREE_PHASE_DERIVED["apparent_power_l1"]
         }
     },
     "adapziote02": {
@@ -477,10 +571,69 @@ PRODUCT_CONFIGS = {
                 "friendly_name": "Mérő sorozatszáma",
                 "icon": "mdi:identifier"
             }
+        },
+        "derived": {
+            "apparent_power_l1": {
+                **THREE_PHASE_DERIVED["apparent_power_l1"],
+                "inputs": ["voltage_l1", "current_phase_l1"]
+            }
         }
 }
 }
 
+# OBIS codes of the P1 telegram mapped to the JSON keys of the meters,
+# so the streaming transport feeds the same entities as the /json endpoint
+OBIS_CODES = {
+    "0-0:1.0.0": "timestamp",
+    "0-0:96.1.0": "meter_serial_number",
+    "0-0:96.14.0": "current_tariff",
+    "0-0:96.3.10": "circuit_breaker_status",
+    "0-0:17.0.0": "limiter_threshold",
+    "1-0:1.8.0": "active_import_energy_total",
+    "1-0:1.8.1": "active_import_energy_tariff_1",
+    "1-0:1.8.2": "active_import_energy_tariff_2",
+    "1-0:1.8.3": "active_import_energy_tariff_3",
+    "1-0:1.8.4": "active_import_energy_tariff_4",
+    "1-0:2.8.0": "active_export_energy_total",
+    "1-0:2.8.1": "active_export_energy_tariff_1",
+    "1-0:2.8.2": "active_export_energy_tariff_2",
+    "1-0:2.8.3": "active_export_energy_tariff_3",
+    "1-0:2.8.4": "active_export_energy_tariff_4",
+    "1-0:15.8.0": "total_active_energy",
+    "1-0:3.8.0": "reactive_import_energy",
+    "1-0:4.8.0": "reactive_export_energy",
+    "1-0:5.8.0": "reactive_energy_qi",
+    "1-0:6.8.0": "reactive_energy_qii",
+    "1-0:7.8.0": "reactive_energy_qiii",
+    "1-0:8.8.0": "reactive_energy_qiv",
+    "1-0:1.7.0": "instantaneous_power_import",
+    "1-0:2.7.0": "instantaneous_power_export",
+    "1-0:21.7.0": "instantaneous_power_import_l1",
+    "1-0:41.7.0": "instantaneous_power_import_l2",
+    "1-0:61.7.0": "instantaneous_power_import_l3",
+    "1-0:22.7.0": "instantaneous_power_export_l1",
+    "1-0:42.7.0": "instantaneous_power_export_l2",
+    "1-0:62.7.0": "instantaneous_power_export_l3",
+    "1-0:5.7.0": "instantaneous_reactive_power_qi",
+    "1-0:6.7.0": "instantaneous_reactive_power_qii",
+    "1-0:7.7.0": "instantaneous_reactive_power_qiii",
+    "1-0:8.7.0": "instantaneous_reactive_power_qiv",
+    "1-0:32.7.0": "voltage_phase_l1",
+    "1-0:52.7.0": "voltage_phase_l2",
+    "1-0:72.7.0": "voltage_phase_l3",
+    "1-0:31.7.0": "current_phase_l1",
+    "1-0:51.7.0": "current_phase_l2",
+    "1-0:71.7.0": "current_phase_l3",
+    "1-0:31.4.0": "current_limit_l1",
+    "1-0:51.4.0": "current_limit_l2",
+    "1-0:71.4.0": "current_limit_l3",
+    "1-0:14.7.0": "frequency",
+    "1-0:13.7.0": "power_factor",
+    "1-0:33.7.0": "power_factor_l1",
+    "1-0:53.7.0": "power_factor_l2",
+    "1-0:73.7.0": "power_factor_l3",
+}
+
 def get_product_list():
     """Return list of available products for dropdown."""
     return [(key, config["name"]) for key, config in PRODUCT_CONFIGS.items()]
@@ -492,3 +645,338 @@ def get_product_sensors(product_type):
 def get_product_name(product_type):
     """Return the display name for a product type."""
     return PRODUCT_CONFIGS.get(product_type, {}).get("name", product_type)
+
+
+# Instantaneous values buffered at 1 s in high-rate sampling mode
+HIGH_RATE_KEYS = (
+    "instantaneous_power_import",
+    "instantaneous_power_export",
+    "instantaneous_power_import_l1",
+    "instantaneous_power_import_l2",
+    "instantaneous_power_import_l3",
+    "current_phase_l1",
+    "current_phase_l2",
+    "current_phase_l3",
+    "voltage_phase_l1",
+    "voltage_phase_l2",
+    "voltage_phase_l3",
+)
+
+
+# ------------------------
+# Product detection
+# ------------------------
+# Below this score a payload is not considered to come from the product
+MIN_MATCH_SCORE = 0.5
+# A runner-up this close to the best match makes the detection ambiguous
+AMBIGUOUS_MATCH_RATIO = 0.9
+
+
+def build_key_index(configs):
+    """Return an inverted index from JSON key to the products declaring it."""
+    index = {}
+    for product_type, product in configs.items():
+        for key in product["sensors"]:
+            index.setdefault(key, set()).add(product_type)
+    return {key: frozenset(products) for key, products in index.items()}
+
+
+KEY_INDEX = build_key_index(PRODUCT_CONFIGS)
+PRODUCT_KEY_COUNTS = {product_type: len(product["sensors"]) for product_type, product in PRODUCT_CONFIGS.items()}
+
+
+def rank_products(payload, product_types=None):
+    """Score a payload against every product in one pass over its keys.
+
+    The score is the share of the product's sensors found in the payload,
+    weighted by how many keys it explains compared to the best product, so
+    a full ADA P1 Meter payload does not also count as a perfect ADA One.
+    Returns (product_type, score) pairs, best first.
+    """
+    hits = {}
+    for key in payload:
+        for product_type in KEY_INDEX.get(key, ()):
+            hits[product_type] = hits.get(product_type, 0) + 1
+    if product_types is not None:
+        hits = {product_type: count for product_type, count in hits.items() if product_type in product_types}
+    if not hits:
+        return []
+    max_hits = max(hits.values())
+    ranking = [
+        (product_type, count / PRODUCT_KEY_COUNTS[product_type] * count / max_hits)
+        for product_type, count in hits.items()
+    ]
+    ranking.sort(key=lambda item: item[1], reverse=True)
+    return ranking
+
+
+def detect_product(payload, product_types=None):
+    """Return the best matching product type, or None if nothing matches well enough."""
+    ranking = rank_products(payload, product_types)
+    if not ranking or ranking[0][1] < MIN_MATCH_SCORE:
+        return None
+    return ranking[0][0]
+
+
+def is_ambiguous(ranking):
+    """True if the runner-up scores almost as well as the best product."""
+    return (
+        len(ranking) > 1
+        and ranking[1][1] >= MIN_MATCH_SCORE
+        and ranking[1][1] >= ranking[0][1] * AMBIGUOUS_MATCH_RATIO
+    )
+
+
+# ------------------------
+# Compiled sensor descriptors
+# ------------------------
+# Sensors that always feed the energy dashboard, whatever their state_class says
+ENERGY_SENSORS = frozenset({"active_import_energy_total", "active_export_energy_total"})
+STATE_CLASSES = frozenset({"total_increasing", "measurement"})
+SENSOR_CONFIG_FIELDS = frozenset({"unit", "friendly_name", "icon", "state_class", "tier", "type", "scale", "range"})
+# Seconds between two decodes of a sensor tier, the meter is still fetched every tick
+REFRESH_TIERS = {"fast": 0, "counter": 60, "slow": 300, "static": 3600}
+VALUE_TYPES = frozenset({"number", "text"})
+# Readings outside these bounds are device glitches, not measurements
+UNIT_RANGES = {"kWh": (0, None), "kVArh": (0, None), "V": (0, 1000), "Hz": (0, 100)}
+# Deadband classes by unit; counters and text are never filtered
+DEADBAND_CLASSES = {
+    "V": "voltage",
+    "Hz": "frequency",
+    "A": "current",
+    "kW": "power",
+    "kVA": "power",
+    "kVAr": "power",
+    "": "power_factor",
+}
+# Smallest change worth a new state, per class; the options flow can override them
+DEFAULT_DEADBANDS = {"voltage": 0.5, "frequency": 0.02, "current": 0.05, "power": 0.01, "power_factor": 0.01}
+# Seconds after which a filtered value is written anyway
+DEFAULT_MAX_AGE = 300
+DERIVED_OPS = frozenset({"sum", "difference", "product", "imbalance"})
+DERIVED_FIELDS = frozenset({"op", "inputs", "scale"})
+
+
+@dataclass(frozen=True, slots=True)
+class SensorSpec:
+    """Immutable, validated description of one product sensor."""
+
+    key: str
+    friendly_name: str
+    icon: str
+    unit: str | None = None
+    state_class: str | None = None
+    device_class: str | None = None
+    tier: str = "fast"
+    kind: str = "number"
+    # Factor from the payload unit to ``unit``
+    scale: float = 1.0
+    minimum: float | None = None
+    maximum: float | None = None
+    deadband_class: str | None = None
+
+
+def compile_sensor(key, config):
+    """Validate one sensor config and resolve its entity attributes."""
+    unknown = config.keys() - SENSOR_CONFIG_FIELDS
+    if unknown:
+        raise ValueError(f"Sensor {key}: unknown fields {sorted(unknown)}")
+    for field in ("friendly_name", "icon"):
+        if not config.get(field):
+            raise ValueError(f"Sensor {key}: missing {field}")
+    state_class = config.get("state_class")
+    if state_class is not None and state_class not in STATE_CLASSES:
+        raise ValueError(f"Sensor {key}: invalid state_class {state_class}")
+
+    # Energy panelhez szükséges beállítás
+    unit = config.get("unit")
+    device_class = None
+    if key in ENERGY_SENSORS or (state_class == "total_increasing" and unit in (None, "kWh")):
+        state_class, device_class, unit = "total_increasing", "energy", "kWh"
+    elif state_class == "measurement":
+        unit = unit or ""
+        if unit == "kW":
+            device_class = "power"
+    elif not unit:
+        unit = None
+
+    # Counters move every few minutes, unitless values (serial, status) hardly ever
+    tier = config.get("tier")
+    if tier is None:
+        if state_class == "total_increasing":
+            tier = "counter"
+        elif state_class == "measurement" or unit:
+            tier = "fast"
+        else:
+            tier = "static"
+    elif tier not in REFRESH_TIERS:
+        raise ValueError(f"Sensor {key}: invalid tier {tier}")
+
+    kind = config.get("type") or ("number" if state_class or unit else "text")
+    if kind not in VALUE_TYPES:
+        raise ValueError(f"Sensor {key}: invalid type {kind}")
+    minimum, maximum = config.get("range") or UNIT_RANGES.get(unit, (None, None))
+    deadband_class = None
+    if kind == "number" and state_class != "total_increasing":
+        deadband_class = DEADBAND_CLASSES.get(unit or "")
+    return SensorSpec(
+        key,
+        config["friendly_name"],
+        config["icon"],
+        unit,
+        state_class,
+        device_class,
+        tier,
+        kind,
+        float(config.get("scale", 1.0)),
+        minimum,
+        maximum,
+        deadband_class,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class DerivedSpec:
+    """A metric computed from other keys of the same snapshot."""
+
+    key: str
+    op: str
+    inputs: tuple
+    scale: float = 1.0
+
+
+def compile_derived(key, config, sensors):
+    """Validate a derived metric and split it into its descriptor and its sensor."""
+    if key in sensors:
+        raise ValueError(f"Derived {key}: clashes with a payload sensor")
+    if config.get("op") not in DERIVED_OPS:
+        raise ValueError(f"Derived {key}: invalid op {config.get('op')}")
+    inputs = tuple(config.get("inputs") or ())
+    missing = [name for name in inputs if name not in sensors]
+    if not inputs or missing:
+        raise ValueError(f"Derived {key}: inputs missing from the product sensors {missing}")
+    derived = DerivedSpec(key, config["op"], inputs, float(config.get("scale", 1.0)))
+    sensor = {name: value for name, value in config.items() if name not in DERIVED_FIELDS}
+    return derived, compile_sensor(key, sensor)
+
+
+def compile_products(configs):
+    """Compile every product into tuples of sensor and derived metric descriptors."""
+    sensors, derived = {}, {}
+    for product_type, product in configs.items():
+        for field in ("name", "host", "default_port", "sensors"):
+            if field not in product:
+                raise ValueError(f"Product {product_type}: missing {field}")
+        specs = [compile_sensor(key, config) for key, config in product["sensors"].items()]
+        metrics = []
+        for key, config in product.get("derived", {}).items():
+            metric, spec = compile_derived(key, config, product["sensors"])
+            metrics.append(metric)
+            specs.append(spec)
+        sensors[product_type] = tuple(specs)
+        derived[product_type] = tuple(metrics)
+    return sensors, derived
+
+
+PRODUCT_SENSOR_SPECS, PRODUCT_DERIVED_SPECS = compile_products(PRODUCT_CONFIGS)
+
+# Site totals of aggregate entries; each meter contributes its first source key present
+SITE_TOTALS = {
+    "instantaneous_power_import": {
+        "sources": ["instantaneous_power_import", "active_power_import"],
+        "unit": "kW",
+        "friendly_name": "Importált teljesítmény",
+        "icon": "mdi:flash",
+        "state_class": "measurement"
+    },
+    "instantaneous_power_export": {
+        "sources": ["instantaneous_power_export"],
+        "unit": "kW",
+        "friendly_name": "Exportált teljesítmény",
+        "icon": "mdi:flash",
+        "state_class": "measurement"
+    },
+    "current_phase_l1": {
+        "sources": ["current_phase_l1"],
+        "unit": "A",
+        "friendly_name": "Áramerősség L1",
+        "icon": "mdi:current-ac",
+        "state_class": "measurement"
+    },
+    "current_phase_l2": {
+        "sources": ["current_phase_l2"],
+        "unit": "A",
+        "friendly_name": "Áramerősség L2",
+        "icon": "mdi:current-ac",
+        "state_class": "measurement"
+    },
+    "current_phase_l3": {
+        "sources": ["current_phase_l3"],
+        "unit": "A",
+        "friendly_name": "Áramerősség L3",
+        "icon": "mdi:current-ac",
+        "state_class": "measurement"
+    },
+    "active_import_energy_total": {
+        "sources": ["active_import_energy_total", "active_energy_import_total"],
+        "unit": "kWh",
+        "friendly_name": "Importált energia",
+        "icon": "mdi:transmission-tower-import",
+        "state_class": "total_increasing"
+    },
+    "active_export_energy_total": {
+        "sources": ["active_export_energy_total"],
+        "unit": "kWh",
+        "friendly_name": "Exportált energia",
+        "icon": "mdi:transmission-tower-export",
+        "state_class": "total_increasing"
+    },
+}
+SITE_TOTAL_SPECS = tuple(
+    compile_sensor(key, {name: value for name, value in config.items() if name != "sources"})
+    for key, config in SITE_TOTALS.items()
+)
+SITE_TOTAL_SOURCES = {key: tuple(config["sources"]) for key, config in SITE_TOTALS.items()}
+
+
+def get_product_sensor_specs(product_type):
+    """Return the compiled sensor descriptors of a product."""
+    return PRODUCT_SENSOR_SPECS.get(product_type, ())
+
+
+def get_product_derived_specs(product_type):
+    """Return the derived metric descriptors of a product."""
+    return PRODUCT_DERIVED_SPECS.get(product_type, ())
+
+
+def compute_derived(data, specs):
+    """Compute every derived metric of a snapshot in a single pass."""
+    derived = {}
+    for spec in specs:
+        values = []
+        for name in spec.inputs:
+            value = data.get(name)
+            if value is None:
+                break
+            try:
+                values.append(float(value))
+            except (TypeError, ValueError):
+                break
+        else:
+            op = spec.op
+            if op == "sum":
+                result = sum(values)
+            elif op == "difference":
+                result = values[0] - sum(values[1:])
+            elif op == "product":
+                result = 1.0
+                for value in values:
+                    result *= value
+            else:
+                # Largest deviation from the phase average, in percent
+                mean = sum(values) / len(values)
+                result = max(abs(value - mean) for value in values) / mean * 100 if mean else 0.0
+            derived[spec.key] = round(result * spec.scale, 4)
+            continue
+        derived[spec.key] = None
+    return derived
@@ -0,0 +1,139 @@
+"""Cached mDNS resolution of ADA meter host names."""
+import asyncio
+import logging
+import socket
+import time
+
+from yarl import URL
+from zeroconf import AddressResolver, IPVersion
+
+from homeassistant.components import zeroconf
+from homeassistant.core import callback
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "adap1ii"
+# A pinned address is trusted this long unless a connection to it fails
+PIN_TTL = 3600
+MDNS_TIMEOUT = 3
+
+
+def is_mdns_host(host):
+    return bool(host) and host.lower().rstrip(".").endswith(".local")
+
+
+def _normalize(host):
+    return host.lower().rstrip(".")
+
+
+@callback
+def async_update_pin(hass, hostname, address):
+    """Pin the address a zeroconf announcement gave for a host name."""
+    client = hass.data.get(DOMAIN, {}).get("client")
+    if client is not None and is_mdns_host(hostname) and address:
+        client.resolver.pin(hostname, str(address), "discovery")
+
+
+class MeterResolver:
+    """Resolves ``.local`` meter hosts once and pins the address.
+
+    Lookups go through the zeroconf instance of Home Assistant, with the
+    system resolver as fallback. A pin is dropped when a connection to it
+    fails or its TTL runs out; discovery announcements replace it.
+    """
+
+    def __init__(self, hass, ttl=PIN_TTL):
+        self._hass = hass
+        self._ttl = ttl
+        self._pins = {}
+        self._locks = {}
+        self._failures = {}
+
+    async def async_resolve_url(self, url):
+        """Return the URL with a pinned address and the Host header to send, if any."""
+        parsed = URL(url)
+        if not is_mdns_host(parsed.host):
+            return url, None
+        address = await self.async_resolve(parsed.host)
+        if address is None:
+            # Let aiohttp try the system resolver itself
+            return url, None
+        host_header = parsed.host if parsed.explicit_port is None else f"{parsed.host}:{parsed.explicit_port}"
+        return str(parsed.with_host(address)), host_header
+
+    async def async_resolve(self, host):
+        """Return the pinned address of a host, looking it up if needed."""
+        host = _normalize(host)
+        pin = self._pins.get(host)
+        if pin is not None and pin["expires"] > time.monotonic():
+            return pin["address"]
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            # Another poll may have resolved it while we waited
+            pin = self._pins.get(host)
+            if pin is not None and pin["expires"] > time.monotonic():
+                return pin["address"]
+            return await self._async_lookup(host)
+
+    def pin(self, host, address, source, latency=None):
+        host = _normalize(host)
+        current = self._pins.get(host)
+        if current is not None and current["address"] != address:
+            _LOGGER.debug("%s moved from %s to %s", host, current["address"], address)
+        self._pins[host] = {
+            "address": address,
+            "source": source,
+            "latency": latency,
+            "resolved_at": time.time(),
+            "expires": time.monotonic() + self._ttl,
+        }
+
+    def invalidate(self, host):
+        """Forget the pin of a host after a connection to it failed."""
+        if host and self._pins.pop(_normalize(host), None) is not None:
+            _LOGGER.debug("Dropped the pinned address of %s", host)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            host: {
+                "address": pin["address"],
+                "source": pin["source"],
+                "resolution_ms": round(pin["latency"] * 1000, 1) if pin["latency"] is not None else None,
+                "resolved_at": pin["resolved_at"],
+                "expires_in": round(pin["expires"] - now),
+                "failed_lookups": self._failures.get(host, 0),
+            }
+            for host, pin in self._pins.items()
+        }
+
+    async def _async_lookup(self, host):
+        start = time.perf_counter()
+        source = "zeroconf"
+        try:
+            address = await self._async_query_mdns(host)
+        except Exception as err:  # zeroconf not loaded, no usable interface, ...
+            _LOGGER.debug("mDNS lookup of %s failed: %s", host, err)
+            address = None
+        if address is None:
+            source = "system"
+            try:
+                infos = await self._hass.loop.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+                address = infos[0][4][0] if infos else None
+            except OSError as err:
+                _LOGGER.debug("System lookup of %s failed: %s", host, err)
+        if address is None:
+            self._failures[host] = self._failures.get(host, 0) + 1
+            return None
+        self.pin(host, address, source, time.perf_counter() - start)
+        return address
+
+    async def _async_query_mdns(self, host):
+        aiozc = await zeroconf.async_get_async_instance(self._hass)
+        resolver = AddressResolver(f"{host}.")
+        if not await resolver.async_request(aiozc.zeroconf, MDNS_TIMEOUT * 1000):
+            return None
+        addresses = resolver.parsed_scoped_addresses(IPVersion.V4Only) or resolver.parsed_scoped_addresses(
+            IPVersion.V6Only
+        )
+        return addresses[0] if addresses else None
@@ -0,0 +1,115 @@
+"""High-rate sampling of instantaneous meter values."""
+from array import array
+
+AGGREGATES = ("mean", "min", "max", "last")
+DEFAULT_SAMPLE_INTERVAL = 1
+DEFAULT_PUBLISH_INTERVAL = 30
+DEFAULT_BUFFER_SIZE = 600
+# Published snapshot key holding the aggregates of the last window
+WINDOW_KEY = "window_stats"
+
+
+class RingBuffer:
+    """Fixed-size buffer of (time, value) samples backed by two float arrays."""
+
+    __slots__ = ("size", "count", "_next", "_times", "_values")
+
+    def __init__(self, size):
+        self.size = size
+        self.count = 0
+        self._next = 0
+        self._times = array("d", bytes(8 * size))
+        self._values = array("d", bytes(8 * size))
+
+    def append(self, when, value):
+        index = self._next
+        self._times[index] = when
+        self._values[index] = value
+        self._next = (index + 1) % self.size
+        if self.count < self.size:
+            self.count += 1
+
+    def _newest_first(self):
+        index = self._next
+        for _ in range(self.count):
+            index = (index - 1) % self.size
+            yield self._times[index], self._values[index]
+
+    def samples(self, since=None):
+        """Return the buffered samples, oldest first."""
+        result = []
+        for when, value in self._newest_first():
+            if since is not None and when < since:
+                break
+            result.append((when, value))
+        result.reverse()
+        return result
+
+    def aggregate(self, since):
+        """Return mean/min/max/last of the samples taken after ``since``."""
+        count = 0
+        total = 0.0
+        low = high = last = None
+        for when, value in self._newest_first():
+            if when <= since:
+                break
+            if last is None:
+                last = low = high = value
+            elif value < low:
+                low = value
+            elif value > high:
+                high = value
+            total += value
+            count += 1
+        if not count:
+            return None
+        return {"mean": total / count, "min": low, "max": high, "last": last, "samples": count}
+
+
+class HighRateSampler:
+    """Buffers every fast poll and closes an aggregation window at the publish cadence."""
+
+    def __init__(self, keys, publish_interval=DEFAULT_PUBLISH_INTERVAL,
+                 buffer_size=DEFAULT_BUFFER_SIZE, aggregates=AGGREGATES):
+        self.keys = tuple(keys)
+        self.publish_interval = publish_interval
+        self.aggregates = tuple(aggregates)
+        self.buffers = {key: RingBuffer(buffer_size) for key in self.keys}
+        self._window_start = None
+
+    def add(self, data, when):
+        """Append the numeric values of a decoded payload."""
+        if self._window_start is None:
+            # Windows are open at the start, the first sample must fall inside
+            self._window_start = when - 0.001
+        for key, buffer in self.buffers.items():
+            value = data.get(key)
+            if value is None:
+                continue
+            try:
+                buffer.append(when, float(value))
+            except (TypeError, ValueError):
+                continue
+
+    def window_due(self, when):
+        return self._window_start is None or when - self._window_start >= self.publish_interval
+
+    def close_window(self, when):
+        """Return the configured aggregates of the window and start a new one."""
+        since = self._window_start if self._window_start is not None else when
+        self._window_start = when
+        stats = {}
+        for key, buffer in self.buffers.items():
+            aggregate = buffer.aggregate(since)
+            if aggregate is not None:
+                stats[key] = {name: round(aggregate[name], 4) for name in self.aggregates}
+        return stats
+
+    def raw(self, key=None):
+        """Return the raw buffers as {key: [[time, value], ...]}."""
+        keys = [key] if key is not None else self.keys
+        return {
+            name: [list(sample) for sample in self.buffers[name].samples()]
+            for name in keys
+            if name in self.buffers
+        }
@@ -0,0 +1,251 @@
+"""Poll scheduling for ADA meters."""
+import asyncio
+import time
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+
+DEFAULT_MIN_INTERVAL = 2
+DEFAULT_MAX_INTERVAL = 60
+# Poll this long after the expected publish, to absorb meter/network jitter
+PUBLISH_MARGIN = 0.5
+OFFSET_WINDOW = 20
+# Every Nth poll looks half a period early, in case the learned period is a multiple
+PROBE_EVERY = 8
+
+DEFAULT_MAX_CONCURRENT = 8
+# Ceiling of the backoff of meters that keep failing, in seconds
+MAX_BACKOFF = 300
+LAG_WINDOW = 200
+# Adaptive polls land right after the publish, meters publishing on the same
+# clock boundary are spread over this many seconds after it
+ADAPTIVE_SPREAD = 1.0
+
+
+def parse_meter_timestamp(value):
+    """Return the meter ``timestamp`` field as epoch seconds, or None.
+
+    Understands epoch numbers, ISO strings and the DSMR ``YYMMDDhhmmssX``
+    format. The meter clock zone is irrelevant, only differences are used.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) / 1000 if value > 1e11 else float(value)
+    text = str(value).strip()
+    if text.replace(".", "", 1).isdigit() and len(text) != 12:
+        return parse_meter_timestamp(float(text))
+    if len(text) in (12, 13) and text[:12].isdigit():
+        try:
+            parsed = datetime.strptime(text[:12], "%y%m%d%H%M%S")
+        except ValueError:
+            return None
+        return parsed.replace(tzinfo=timezone.utc).timestamp()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class AdaptiveInterval:
+    """Learns a meter's publish period and times polls just after it publishes."""
+
+    def __init__(self, default_interval, min_interval=DEFAULT_MIN_INTERVAL, max_interval=DEFAULT_MAX_INTERVAL):
+        self.default_interval = default_interval
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.period = None
+        self.duplicates = 0
+        self._polls = 0
+        self._last_value = None
+        self._last_meter_time = None
+        self._last_change = None
+        # receive time - meter time, the minimum is the closest to the real offset
+        self._offsets = deque(maxlen=OFFSET_WINDOW)
+
+    def observe(self, value, now=None):
+        """Record the ``timestamp`` of a poll and return the delay until the next one."""
+        now = time.time() if now is None else now
+        if value is None:
+            return self._clamp(self.default_interval)
+        if value == self._last_value:
+            # The meter did not publish yet
+            self.duplicates += 1
+            if self.period is None:
+                # Still learning, look again soon
+                return self._clamp(self.min_interval)
+            if self._last_meter_time is not None:
+                expected = self._last_meter_time + min(self._offsets) + self.period
+            else:
+                expected = self._last_change + self.period
+            # Past the expected publish the meter is late, then look again soon
+            return self._clamp(expected + PUBLISH_MARGIN - now)
+
+        meter_time = parse_meter_timestamp(value)
+        if meter_time is not None:
+            if self._last_meter_time is not None and meter_time > self._last_meter_time:
+                self._learn(meter_time - self._last_meter_time)
+            self._last_meter_time = meter_time
+            self._offsets.append(now - meter_time)
+        elif self._last_change is not None:
+            self._learn(now - self._last_change)
+        self._last_value = value
+        self._last_change = now
+
+        if self.period is None:
+            return self._clamp(self.default_interval)
+        if meter_time is not None:
+            expected = meter_time + min(self._offsets) + self.period
+        else:
+            expected = now + self.period
+        self._polls += 1
+        if self._polls % PROBE_EVERY == 0:
+            expected -= self.period / 2
+        return self._clamp(expected + PUBLISH_MARGIN - now)
+
+    def _learn(self, sample):
+        if sample <= 0:
+            return
+        if self.period is None:
+            self.period = sample
+            return
+        if sample < self.period * 0.75:
+            # An early probe caught a publish, the period was a multiple
+            self.period = sample
+            return
+        # A late poll can span several publishes
+        skipped = round(sample / self.period)
+        if skipped >= 2:
+            sample /= skipped
+        self.period += (sample - self.period) * 0.2
+
+    def _clamp(self, delay):
+        return min(max(delay, self.min_interval), self.max_interval)
+
+
+class FleetScheduler:
+    """Owns the polling of every HTTP meter of the integration.
+
+    Meters get a fixed phase within their interval so they do not fire in
+    bursts, at most ``max_concurrent`` requests run at once, and meters that
+    keep failing back off exponentially instead of holding timeout slots.
+    """
+
+    def __init__(self, hass, max_concurrent=DEFAULT_MAX_CONCURRENT):
+        self._hass = hass
+        self._semaphore = asyncio.Semaphore(max_concurrent)
+        self._members = {}
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self.max_concurrent = max_concurrent
+        self.polls = 0
+        self.lag = deque(maxlen=LAG_WINDOW)
+
+    def add(self, coordinator, poll_now=False):
+        """Start polling a coordinator, after its phase offset or right away."""
+        if coordinator in self._members:
+            return
+        loop_time = self._hass.loop.time()
+        share = _phase_share(coordinator)
+        due = loop_time if poll_now else loop_time + share * coordinator.poll_interval
+        self._members[coordinator] = _Member(due, share * ADAPTIVE_SPREAD)
+        self._wakeup.set()
+        if self._task is None:
+            self._task = self._hass.async_create_background_task(self._async_run(), "adap1ii fleet scheduler")
+
+    def reschedule(self, coordinator):
+        """Poll a coordinator now, after its settings or endpoint changed."""
+        member = self._members.get(coordinator)
+        if member is None:
+            return
+        member.due = self._hass.loop.time()
+        member.failures = 0
+        member.jitter = _phase_share(coordinator) * ADAPTIVE_SPREAD
+        self._wakeup.set()
+
+    def remove(self, coordinator):
+        """Stop polling a coordinator."""
+        self._members.pop(coordinator, None)
+        if not self._members and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self):
+        """Return scheduling lag and load figures."""
+        lags = sorted(self.lag)
+        return {
+            "meters": len(self._members),
+            "max_concurrent": self.max_concurrent,
+            "in_flight": sum(member.running for member in self._members.values()),
+            "polls": self.polls,
+            "lag_mean": round(sum(lags) / len(lags), 3) if lags else None,
+            "lag_p95": round(lags[int(len(lags) * 0.95)], 3) if lags else None,
+            "lag_max": round(lags[-1], 3) if lags else None,
+            "backing_off": [
+                coordinator.url for coordinator, member in self._members.items() if member.failures
+            ],
+        }
+
+    async def _async_run(self):
+        loop = self._hass.loop
+        while True:
+            self._wakeup.clear()
+            now = loop.time()
+            next_due = None
+            for coordinator, member in list(self._members.items()):
+                if member.running:
+                    continue
+                if member.due <= now:
+                    member.running = True
+                    self._hass.async_create_background_task(
+                        self._async_poll(coordinator, member), f"adap1ii poll {coordinator.url}"
+                    )
+                elif next_due is None or member.due < next_due:
+                    next_due = member.due
+            try:
+                async with asyncio.timeout(None if next_due is None else next_due - now):
+                    await self._wakeup.wait()
+            except TimeoutError:
+                pass
+
+    async def _async_poll(self, coordinator, member):
+        loop = self._hass.loop
+        try:
+            async with self._semaphore:
+                # Time spent waiting for a slot counts as lag too
+                self.lag.append(loop.time() - member.due)
+                self.polls += 1
+                await coordinator.async_refresh()
+        finally:
+            member.running = False
+        interval = coordinator.poll_interval
+        if coordinator.last_update_success:
+            member.failures = 0
+            if coordinator.adaptive:
+                # The delay aims at the publish, the jitter keeps the meter's phase
+                member.due = loop.time() + interval + member.jitter
+            else:
+                # Keep the phase, skip ticks that were missed
+                member.due += interval * ((loop.time() - member.due) // interval + 1)
+        else:
+            member.failures += 1
+            member.due = loop.time() + min(interval * 2 ** member.failures, MAX_BACKOFF)
+        self._wakeup.set()
+
+
+def _phase_share(coordinator):
+    """Return a stable share in [0, 1) of a meter, spreading meters over an interval."""
+    return zlib.crc32(coordinator.url.encode()) / 2**32
+
+
+class _Member:
+    __slots__ = ("due", "failures", "jitter", "running")
+
+    def __init__(self, due, jitter=0.0):
+        self.due = due
+        self.failures = 0
+        self.jitter = jitter
+        self.running = False
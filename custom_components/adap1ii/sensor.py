@@ -1,134 +1,405 @@
 import logging
-import aiohttp
-import async_timeout
-from datetime import timedelta
-
-from homeassistant.helpers.update_coordinator import (
-    CoordinatorEntity,
-    DataUpdateCoordinator,
-    UpdateFailed,
-)
+import time
+
+from homeassistant.const import EntityCategory
+from homeassistant.core import callback
+from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_call_later
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .product_config import get_product_sensors, get_product_name
+from .aggregate import is_aggregate_entry
+from .coordinator import SIGNAL_ENTRY_UPDATED, build_url
+from .product_config import (
+    DEFAULT_DEADBANDS,
+    DEFAULT_MAX_AGE,
+    SITE_TOTAL_SPECS,
+    SensorSpec,
+    get_product_name,
+    get_product_sensor_specs,
+)
+from .sampling import WINDOW_KEY
+from .statistics import StatisticsBackfill
 
 from homeassistant.components.sensor import SensorEntity, SensorStateClass, SensorDeviceClass
 
 _LOGGER = logging.getLogger(__name__)
-SCAN_INTERVAL = timedelta(seconds=10)
+DOMAIN = "adap1ii"
+
+# key, name, icon, unit and the PollMetrics method giving the value
+POLL_SENSORS = (
+    ("poll_latency", "Poll latency", "mdi:timer-outline", "ms", "latency_ms"),
+    ("poll_success_rate", "Poll success rate", "mdi:check-network-outline", "%", "success_percent"),
+)
 
 
 async def async_setup_entry(hass, config_entry, async_add_entities):
-    config_data = {**config_entry.data, **config_entry.options}
-    prefix = config_data.get("prefix", "")
-    product_type = config_data.get("product_type", "default_type")
-    
-    # ------------------------
-    # URL logika
-    # ------------------------
-    url = config_data.get("url")
-    if not url:
-        host = config_data.get("host", "okosvillanyora.local")
-        port = config_data.get("port", 8989)
-        url = f"http://{host}:{port}/json"
-    
-    device_id = f"ada_p1_meter_{url}_{product_type}"
-
-    product_sensors = get_product_sensors(product_type)
-    product_name = get_product_name(product_type)
-
-    async def async_update_data():
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with async_timeout.timeout(10):
-                    async with session.get(url) as response:
-                        return await response.json()
-        except Exception as err:
-            raise UpdateFailed(f"Error fetching data from {url}: {err}") from err
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name=f"{prefix} {product_name} coordinator",
-        update_method=async_update_data,
-        update_interval=SCAN_INTERVAL,
+    if is_aggregate_entry(config_entry):
+        _async_setup_site(hass, config_entry, async_add_entities)
+        return
+
+    coordinator = hass.data[DOMAIN]["entries"][config_entry.entry_id]
+    entities = MeterEntities(hass, config_entry, coordinator, async_add_entities)
+    await entities.async_apply({**config_entry.data, **config_entry.options})
+    # Option changes the coordinator could take in place reach the entities here
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_ENTRY_UPDATED.format(config_entry.entry_id), entities.async_apply
+        )
     )
 
-    await coordinator.async_config_entry_first_refresh()
-
-    sensors = []
-    for sensor_key, sensor_config in product_sensors.items():
-        unique_id = f"{url}_{product_type}_{sensor_key}"
-        sensors.append(
-            Ada12Sensor(
-                coordinator=coordinator,
-                product_type=product_type,
-                sensor_key=sensor_key,
-                sensor_config=sensor_config,
-                unique_id=unique_id,
-                prefix=prefix,
-                name=f"{prefix} {product_name} {sensor_config['friendly_name']}",
-                device_id=device_id,
+
+@callback
+def _async_setup_site(hass, config_entry, async_add_entities):
+    aggregator = hass.data[DOMAIN]["aggregates"][config_entry.entry_id]
+    device_info = DeviceInfo(
+        identifiers={(DOMAIN, f"site_{config_entry.entry_id}")},
+        name=config_entry.title,
+        manufacturer="ADA",
+        model="Site aggregate",
+    )
+    async_add_entities(
+        AdaSiteSensor(
+            aggregator,
+            spec,
+            unique_id=f"{config_entry.entry_id}_{spec.key}",
+            name=f"{config_entry.title} {spec.friendly_name}",
+            device_info=device_info,
+        )
+        for spec in SITE_TOTAL_SPECS
+    )
+
+
+class MeterEntities:
+    """The sensors of one meter entry, kept in line with its options.
+
+    A changed endpoint, product or prefix is applied to the running
+    entities. Sensors of both the old and the new product move to their new
+    unique id in the entity registry, so they keep their entity id and
+    history; only sensors that appear or disappear are added or removed.
+    """
+
+    def __init__(self, hass, config_entry, coordinator, async_add_entities):
+        self._hass = hass
+        self._entry = config_entry
+        self._coordinator = coordinator
+        self._add_entities = async_add_entities
+        # sensor key -> entity
+        self._entities = {}
+        self._url = None
+        self._device_id = None
+        self._backfill = None
+
+    async def async_apply(self, config_data):
+        prefix = config_data.get("prefix", "")
+        product_type = config_data.get("product_type", "default_type")
+        change_detection = config_data.get("change_detection", True)
+        max_age = config_data.get("max_age", DEFAULT_MAX_AGE)
+
+        # ------------------------
+        # URL logika
+        # ------------------------
+        url = build_url(config_data)
+        device_id = f"ada_p1_meter_{url}_{product_type}"
+        product_name = get_product_name(product_type)
+        device_info = DeviceInfo(
+            identifiers={(device_id,)},
+            name=f"{prefix} {product_type}",
+            manufacturer="ADA",
+            model=product_type,
+        )
+        device = self._async_update_device(device_id, device_info)
+
+        specs = get_product_sensor_specs(product_type)
+        wanted = {
+            spec.key: (
+                f"{url}_{product_type}_{spec.key}",
+                f"{prefix} {product_name} {spec.friendly_name}",
+                spec,
+            )
+            for spec in specs
+        }
+        # Health of the poll pipeline, for finding slow meters and access points
+        poll_sensors = POLL_SENSORS if self._coordinator.transport != "dsmr" else POLL_SENSORS[1:]
+        for key, friendly_name, icon, unit, metric in poll_sensors:
+            wanted[key] = (
+                f"{url}_{product_type}_{key}",
+                f"{prefix} {product_name} {friendly_name}",
+                (icon, unit, metric),
             )
+
+        registry = er.async_get(self._hass)
+        for key in self._entities.keys() - wanted.keys():
+            self._async_remove(registry, self._entities.pop(key))
+
+        added = []
+        for key, (unique_id, name, spec) in wanted.items():
+            entity = self._entities.get(key)
+            if entity is not None and not self._async_move(registry, entity, unique_id, device):
+                self._async_remove(registry, entity)
+                entity = None
+            if isinstance(spec, SensorSpec):
+                settings = {
+                    "change_detection": change_detection,
+                    "deadband": config_data.get(
+                        f"deadband_{spec.deadband_class}", DEFAULT_DEADBANDS.get(spec.deadband_class, 0)
+                    ),
+                    "max_age": max_age,
+                }
+                if entity is None:
+                    entity = Ada12Sensor(self._coordinator, spec, unique_id, name, device_info, **settings)
+                else:
+                    entity.configure(spec, unique_id, name, device_info, **settings)
+            elif entity is None:
+                icon, unit, metric = spec
+                entity = AdaPollSensor(self._coordinator, metric, unique_id, name, icon, unit, device_info)
+            else:
+                entity.rename(unique_id, name, device_info)
+            if self._entities.get(key) is not entity:
+                self._entities[key] = entity
+                added.append(entity)
+            elif entity.hass is not None:
+                entity.async_write_ha_state()
+        if added:
+            self._add_entities(added)
+
+        # Counters missed during outages are spread over the gap in the long-term statistics
+        counters = {
+            spec.key: (f"{url}_{product_type}_{spec.key}", spec.unit)
+            for spec in specs
+            if spec.state_class == "total_increasing"
+        }
+        if self._backfill is not None:
+            self._backfill.set_counters(counters, new_meter=url != self._url)
+        elif counters and "recorder" in self._hass.config.components:
+            self._backfill = StatisticsBackfill(self._hass, self._coordinator, self._entry.entry_id, counters)
+            await self._backfill.async_load()
+            self._entry.async_on_unload(self._coordinator.async_add_listener(self._backfill.async_handle_update))
+        self._url = url
+
+    @callback
+    def _async_update_device(self, device_id, device_info):
+        """Carry the device over to new identifiers and return its registry entry."""
+        devices = dr.async_get(self._hass)
+        old_device_id, self._device_id = self._device_id, device_id
+        device = devices.async_get_device(identifiers=device_info["identifiers"])
+        old = None
+        if old_device_id not in (None, device_id):
+            old = devices.async_get_device(identifiers={(old_device_id,)})
+        if old is not None and device is None:
+            device, old = old, None
+        if device is None:
+            # Created when the first entity is added
+            return None
+        if old is not None:
+            # Another entry already has a device for the new identifiers, leave ours behind
+            devices.async_update_device(old.id, remove_config_entry_id=self._entry.entry_id)
+        return devices.async_update_device(
+            device.id,
+            new_identifiers=device_info["identifiers"],
+            name=device_info["name"],
+            model=device_info["model"],
         )
 
-    async_add_entities(sensors)
+    @callback
+    def _async_move(self, registry, entity, unique_id, device):
+        """Point the registry entry of a running entity at its new unique id.
 
+        Returns False when another entity already holds that unique id.
+        """
+        if entity.unique_id == unique_id:
+            return True
+        # Disabled entities are not running but have a registry entry all the same
+        entity_id = registry.async_get_entity_id("sensor", DOMAIN, entity.unique_id)
+        if entity_id is None:
+            return True
+        if registry.async_get_entity_id("sensor", DOMAIN, unique_id) is not None:
+            return False
+        changes = {"new_unique_id": unique_id}
+        if device is not None:
+            changes["device_id"] = device.id
+        registry.async_update_entity(entity_id, **changes)
+        return True
+
+    @callback
+    def _async_remove(self, registry, entity):
+        entity_id = registry.async_get_entity_id("sensor", DOMAIN, entity.unique_id)
+        if entity_id is not None:
+            # A running entity removes itself from the platform when its registry entry goes
+            registry.async_remove(entity_id)
+        elif entity.hass is not None:
+            self._hass.async_create_task(entity.async_remove())
 
-class Ada12Sensor(CoordinatorEntity, SensorEntity):
-    ENERGY_SENSORS = ["active_import_energy_total", "active_export_energy_total"]
 
-    def __init__(self, coordinator, product_type, sensor_key, sensor_config, unique_id, prefix, name, device_id):
+class Ada12Sensor(CoordinatorEntity, SensorEntity):
+    def __init__(self, coordinator, spec, unique_id, name, device_info, change_detection=True,
+                 deadband=0, max_age=DEFAULT_MAX_AGE):
         super().__init__(coordinator)
-        self._product_type = product_type
-        self._sensor_key = sensor_key
-        self._sensor_config = sensor_config
-        self._unique_id = unique_id
-        self._prefix = prefix
-        self._name = name
-        self._device_id = device_id
-        self._attr_icon = sensor_config["icon"]
+        self._written_value = None
+        self._written_at = 0.0
+        # Set while the deadband holds a value back, cancels the max age timer
+        self._cancel_max_age = None
+        self._held_value = None
+        self.configure(spec, unique_id, name, device_info, change_detection, deadband, max_age)
+
+    def configure(self, spec, unique_id, name, device_info, change_detection=True,
+                  deadband=0, max_age=DEFAULT_MAX_AGE):
+        """Describe the sensor, also used on a running one after the options changed."""
+        self._sensor_key = spec.key
+        self._attr_unique_id = unique_id
+        self._attr_name = name
+        self._attr_device_info = device_info
+        self._attr_icon = spec.icon
+        self._attr_native_unit_of_measurement = spec.unit
+        self._attr_state_class = SensorStateClass(spec.state_class) if spec.state_class is not None else None
+        self._attr_device_class = SensorDeviceClass(spec.device_class) if spec.device_class is not None else None
         self._extra_attrs = {"uid": unique_id}
+        self._stale_attrs = {"uid": unique_id, "stale": True}
+        self._change_detection = change_detection
+        self._deadband = deadband
+        self._max_age = max_age
+        # The next update writes the state whatever changed
+        self._written = None
+        self._async_cancel_max_age()
 
-        # Energy panelhez szükséges beállítás
-        state_class = sensor_config.get("state_class")
-        if state_class == "total_increasing" or sensor_key in self.ENERGY_SENSORS:
-            self._attr_device_class = SensorDeviceClass.ENERGY
-            self._attr_state_class = SensorStateClass.TOTAL_INCREASING
-            self._attr_native_unit_of_measurement = "kWh"
-        elif state_class == "measurement":
-            self._attr_state_class = SensorStateClass.MEASUREMENT
-            unit = sensor_config.get("unit", "")
-            self._attr_native_unit_of_measurement = unit
-            if unit == "kW":
-                self._attr_device_class = SensorDeviceClass.POWER
-        elif sensor_config.get("unit"):
-            self._attr_native_unit_of_measurement = sensor_config["unit"]
+    @property
+    def native_value(self):
+        # Already typed and scaled by the coordinator
+        return (self.coordinator.data or {}).get(self._sensor_key)
 
     @property
-    def name(self):
-        return self._name
+    def extra_state_attributes(self):
+        attrs = self._stale_attrs if self.coordinator.stale else self._extra_attrs
+        # Aggregates of the last high-rate sampling window
+        window = (self.coordinator.data or {}).get(WINDOW_KEY)
+        if window and self._sensor_key in window:
+            return {**attrs, **window[self._sensor_key]}
+        return attrs
+
+    @callback
+    def _handle_coordinator_update(self):
+        """Write the state only when the value, attributes or availability changed."""
+        attrs = self.extra_state_attributes
+        if self._written is not None and (self.available, attrs) == self._written:
+            if self._cancel_max_age is None:
+                changed_keys = self.coordinator.changed_keys
+                if self._change_detection and changed_keys is not None and self._sensor_key not in changed_keys:
+                    return
+            elif self.native_value == self._written_value:
+                # Back at the written value, nothing is held back any more
+                self._async_cancel_max_age()
+                return
+            if self._deadband and self._within_deadband():
+                value = self.native_value
+                if value != self._held_value:
+                    # One suppressed write per held back value, not per update it stays held
+                    self._held_value = value
+                    self.coordinator.suppressed_writes[self._sensor_key] += 1
+                if self._cancel_max_age is None:
+                    # Unchanged keys skip this check, the timer writes the held back value in time
+                    self._cancel_max_age = async_call_later(
+                        self.hass,
+                        max(self._max_age - (time.monotonic() - self._written_at), 0),
+                        self._async_max_age_expired,
+                    )
+                return
+        self._async_write_state()
+
+    @callback
+    def _async_write_state(self):
+        self._async_cancel_max_age()
+        self._written = (self.available, dict(self.extra_state_attributes or {}))
+        self._written_value = self.native_value
+        self._written_at = time.monotonic()
+        self.coordinator.state_writes += 1
+        super()._handle_coordinator_update()
+
+    @callback
+    def _async_max_age_expired(self, _now):
+        self._cancel_max_age = None
+        self._async_write_state()
+
+    @callback
+    def _async_cancel_max_age(self):
+        self._held_value = None
+        if self._cancel_max_age is not None:
+            self._cancel_max_age()
+            self._cancel_max_age = None
+
+    async def async_will_remove_from_hass(self):
+        await super().async_will_remove_from_hass()
+        self._async_cancel_max_age()
+
+    def _within_deadband(self):
+        """True while the value stays near the last written one and that is not too old."""
+        value, written = self.native_value, self._written_value
+        if not isinstance(value, (int, float)) or not isinstance(written, (int, float)):
+            return False
+        return abs(value - written) < self._deadband and time.monotonic() - self._written_at < self._max_age
+
+
+class AdaPollSensor(CoordinatorEntity, SensorEntity):
+    """Diagnostic sensor reading the poll metrics of the coordinator."""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, metric, unique_id, name, icon, unit, device_info):
+        super().__init__(coordinator)
+        self._metric = metric
+        self._attr_unique_id = unique_id
+        self._attr_name = name
+        self._attr_icon = icon
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_info = device_info
+
+    def rename(self, unique_id, name, device_info):
+        self._attr_unique_id = unique_id
+        self._attr_name = name
+        self._attr_device_info = device_info
 
     @property
-    def unique_id(self):
-        return self._unique_id
+    def available(self):
+        # Failing polls are exactly what these sensors report on
+        return True
 
     @property
-    def device_info(self):
-        return {
-            "identifiers": {(self._device_id,)},  
-            "name": f"{self._prefix} {self._product_type}",
-            "manufacturer": "ADA",
-            "model": self._product_type,
-        }      
-            
+    def native_value(self):
+        return getattr(self.coordinator.metrics, self._metric)()
+
+
+class AdaSiteSensor(CoordinatorEntity, SensorEntity):
+    """A site total of an aggregate entry."""
+
+    def __init__(self, aggregator, spec, unique_id, name, device_info):
+        super().__init__(aggregator)
+        self._total_key = spec.key
+        self._attr_unique_id = unique_id
+        self._attr_name = name
+        self._attr_device_info = device_info
+        self._attr_icon = spec.icon
+        self._attr_native_unit_of_measurement = spec.unit
+        if spec.state_class is not None:
+            self._attr_state_class = SensorStateClass(spec.state_class)
+        if spec.device_class is not None:
+            self._attr_device_class = SensorDeviceClass(spec.device_class)
+
     @property
     def native_value(self):
-        data = self.coordinator.data or {}
-        if self._sensor_key not in data:
-            return None
-        return data[self._sensor_key]
+        return self.coordinator.data[self._total_key]["value"]
 
     @property
     def extra_state_attributes(self):
-        return self._extra_attrs
-
+        missing = self.coordinator.data[self._total_key]["missing"]
+        entries = self.hass.config_entries
+        return {
+            # True while some meters are left out or carried over from their last reading
+            "partial": bool(missing),
+            "missing_meters": [
+                entry.title if (entry := entries.async_get_entry(meter_id)) else meter_id
+                for meter_id in missing
+            ],
+            "meters": len(self.coordinator.meter_ids),
+        }
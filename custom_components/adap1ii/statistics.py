@@ -0,0 +1,153 @@
+"""Long-term statistics backfill of cumulative counters after outages."""
+import logging
+import time
+from datetime import datetime, timezone
+
+from homeassistant.components.recorder import get_instance
+from homeassistant.components.recorder.models import StatisticMeanType
+from homeassistant.components.recorder.statistics import async_import_statistics, get_last_statistics
+from homeassistant.core import callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.storage import Store
+
+_LOGGER = logging.getLogger(__name__)
+
+DOMAIN = "adap1ii"
+STORE_VERSION = 1
+SAVE_DELAY = 300
+HOUR = 3600
+# Shorter gaps are left to the recorder
+MIN_GAP = 900
+# Never rewrite more than this many hours at once
+MAX_BACKFILL_HOURS = 24 * 31
+UNIT_CLASSES = {"kWh": "energy"}
+
+
+def hour_floor(timestamp):
+    return timestamp - timestamp % HOUR
+
+
+def backfill_store(hass, entry_id):
+    """Return the Store holding the last counter samples of an entry."""
+    return Store(hass, STORE_VERSION, f"{DOMAIN}.backfill.{entry_id}")
+
+
+class StatisticsBackfill:
+    """Spreads counter jumps over the hours of an outage instead of the first hour after it.
+
+    The last sample of every counter is kept in a Store, so outages of Home
+    Assistant itself are covered too. When the next sample comes in after a
+    gap, the counter is interpolated linearly over the missed hours and the
+    hourly rows are written with one statistics import per counter. The
+    import replaces existing rows, so running it again after a restart
+    yields the same result.
+    """
+
+    def __init__(self, hass, coordinator, entry_id, counters):
+        self._hass = hass
+        self._coordinator = coordinator
+        # sensor key -> (unique_id, unit)
+        self._counters = counters
+        self._store = backfill_store(hass, entry_id)
+        self._last = {}
+        self._save_pending = False
+
+    def set_counters(self, counters, new_meter=False):
+        """Follow reconfigured sensors; samples of another meter would fake a gap."""
+        self._counters = counters
+        if new_meter:
+            self._last = {}
+        else:
+            self._last = {key: last for key, last in self._last.items() if key in counters}
+
+    async def async_load(self):
+        self._last = await self._store.async_load() or {}
+
+    @callback
+    def async_handle_update(self):
+        """Coordinator listener recording samples and spotting gaps."""
+        coordinator = self._coordinator
+        if not coordinator.last_update_success or coordinator.stale or not coordinator.data:
+            return
+        now = time.time()
+        gaps = []
+        for key in self._counters:
+            try:
+                value = float(coordinator.data[key])
+            except (KeyError, TypeError, ValueError):
+                continue
+            last = self._last.get(key)
+            if (
+                last is not None
+                and now - last["t"] >= MIN_GAP
+                and hour_floor(now) > hour_floor(last["t"])
+                and value >= last["v"]
+            ):
+                gaps.append((key, last["t"], last["v"], now, value))
+            self._last[key] = {"t": now, "v": value}
+
+        if not self._save_pending:
+            self._save_pending = True
+            self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+        if gaps:
+            self._hass.async_create_background_task(self._async_backfill(gaps), f"{DOMAIN} statistics backfill")
+
+    def _data_to_save(self):
+        self._save_pending = False
+        return self._last
+
+    async def _async_backfill(self, gaps):
+        registry = er.async_get(self._hass)
+        for key, start_time, start_value, end_time, end_value in gaps:
+            unique_id, unit = self._counters[key]
+            statistic_id = registry.async_get_entity_id("sensor", DOMAIN, unique_id)
+            if statistic_id is None:
+                continue
+            rows = await self._async_build_rows(statistic_id, start_time, start_value, end_time, end_value)
+            if not rows:
+                continue
+            metadata = {
+                "has_mean": False,
+                "mean_type": StatisticMeanType.NONE,
+                "has_sum": True,
+                "name": None,
+                "source": "recorder",
+                "statistic_id": statistic_id,
+                "unit_class": UNIT_CLASSES.get(unit),
+                "unit_of_measurement": unit,
+            }
+            async_import_statistics(self._hass, metadata, rows)
+            _LOGGER.info(
+                "Backfilled %s hours of %s after a %.0f minute gap",
+                len(rows), statistic_id, (end_time - start_time) / 60,
+            )
+
+    async def _async_build_rows(self, statistic_id, start_time, start_value, end_time, end_value):
+        first_hour = hour_floor(start_time)
+        last_hour = hour_floor(end_time)
+        hours = int((last_hour - first_hour) // HOUR)
+        if hours <= 0 or hours > MAX_BACKFILL_HOURS:
+            return []
+
+        # The newest row from before the gap anchors the running sum
+        recent = await get_instance(self._hass).async_add_executor_job(
+            get_last_statistics, self._hass, hours + 2, statistic_id, True, {"state", "sum"}
+        )
+        base = next(
+            (row for row in recent.get(statistic_id, []) if row["start"] < first_hour),
+            None,
+        )
+        if base is None or base.get("sum") is None or base.get("state") is None:
+            return []
+
+        slope = (end_value - start_value) / (end_time - start_time)
+        rows = []
+        for index in range(hours):
+            start = first_hour + index * HOUR
+            state = start_value + slope * (start + HOUR - start_time)
+            rows.append({
+                "start": datetime.fromtimestamp(start, timezone.utc),
+                "state": round(state, 4),
+                "sum": round(base["sum"] + state - base["state"], 4),
+            })
+        return rows
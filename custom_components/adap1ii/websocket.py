@@ -0,0 +1,196 @@
+"""Websocket subscription to the raw numeric snapshots of a meter."""
+import time
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.event import async_call_later
+
+from .aggregate import SIGNAL_METER_UNLOADED
+
+DOMAIN = "adap1ii"
+# Ceiling of the per subscriber rate limit, in seconds between messages
+MAX_MIN_INTERVAL = 3600
+MAX_WINDOW = 1000
+
+
+def numeric_value(value):
+    """Return the value if it is a number, None otherwise."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    return None
+
+
+@callback
+def async_setup_websocket(hass):
+    websocket_api.async_register_command(hass, ws_subscribe_snapshots)
+    websocket_api.async_register_command(hass, ws_ack_snapshot)
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/subscribe_snapshots",
+    vol.Required("config_entry_id"): str,
+    vol.Optional("min_interval", default=0): vol.All(vol.Coerce(float), vol.Range(min=0, max=MAX_MIN_INTERVAL)),
+    vol.Optional("window", default=0): vol.All(vol.Coerce(int), vol.Range(min=0, max=MAX_WINDOW)),
+})
+@callback
+def ws_subscribe_snapshots(hass, connection, msg):
+    """Stream the numeric keys of a meter as they change, straight from its coordinator."""
+    coordinator = hass.data.get(DOMAIN, {}).get("entries", {}).get(msg["config_entry_id"])
+    if coordinator is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "No loaded meter entry with this id")
+        return
+    subscription = SnapshotSubscription(
+        hass, connection, msg["id"], msg["config_entry_id"], coordinator, msg["min_interval"], msg["window"]
+    )
+    connection.subscriptions[msg["id"]] = subscription.async_start()
+    connection.send_result(msg["id"])
+    subscription.async_send_pending()
+
+
+@websocket_api.websocket_command({
+    vol.Required("type"): f"{DOMAIN}/ack_snapshot",
+    vol.Required("subscription"): int,
+    vol.Required("seq"): int,
+    vol.Optional("resync", default=False): bool,
+})
+@callback
+def ws_ack_snapshot(hass, connection, msg):
+    """Confirm the messages of a subscription up to ``seq``, optionally asking for a full snapshot."""
+    subscription = hass.data.get(DOMAIN, {}).get("subscriptions", {}).get((connection, msg["subscription"]))
+    if subscription is None:
+        connection.send_error(msg["id"], websocket_api.ERR_NOT_FOUND, "Unknown subscription")
+        return
+    subscription.async_ack(msg["seq"], msg["resync"])
+    connection.send_result(msg["id"])
+
+
+class SnapshotSubscription:
+    """Sends the numeric changes of one coordinator to one websocket client.
+
+    The first message, and any later one after ``changed_keys`` was None or
+    the client asked for a resync, holds every numeric key with
+    ``full: true``. The others hold only the changed keys, with null for a
+    key that lost its value. ``seq`` counts the messages of the
+    subscription, so a client can spot a gap and ask for a resync.
+
+    Changes are merged while the subscriber is held back, which bounds the
+    memory of a slow client to one value per key:
+
+    * ``min_interval`` spaces messages at least that many seconds apart.
+    * With ``window`` set, at most that many messages are sent before the
+      client acknowledges them with ``ack_snapshot``.
+    """
+
+    def __init__(self, hass, connection, msg_id, entry_id, coordinator, min_interval=0, window=0):
+        self._hass = hass
+        self._connection = connection
+        self._msg_id = msg_id
+        self._entry_id = entry_id
+        self._coordinator = coordinator
+        self._min_interval = min_interval
+        self._window = window
+        self.seq = 0
+        self._acked = 0
+        self._pending = {}
+        self._full = True
+        self._available = None
+        self._last_sent = 0.0
+        self._cancel_timer = None
+        self._unsubs = []
+
+    @callback
+    def async_start(self):
+        """Start listening to the coordinator and return the unsubscribe callback."""
+        self._unsubs = [
+            self._coordinator.async_add_listener(self._async_handle_update),
+            async_dispatcher_connect(self._hass, SIGNAL_METER_UNLOADED, self._async_meter_unloaded),
+        ]
+        self._hass.data[DOMAIN].setdefault("subscriptions", {})[(self._connection, self._msg_id)] = self
+        return self._async_stop
+
+    @callback
+    def _async_stop(self):
+        for unsub in self._unsubs:
+            unsub()
+        self._unsubs = []
+        if self._cancel_timer is not None:
+            self._cancel_timer()
+            self._cancel_timer = None
+        self._hass.data[DOMAIN].get("subscriptions", {}).pop((self._connection, self._msg_id), None)
+
+    @callback
+    def async_ack(self, seq, resync=False):
+        self._acked = max(self._acked, min(seq, self.seq))
+        if resync:
+            self._full = True
+        self.async_send_pending()
+
+    @callback
+    def _async_meter_unloaded(self, entry_id):
+        if entry_id != self._entry_id:
+            return
+        # The coordinator goes away or gets shared differently, the client has to subscribe again
+        self.seq += 1
+        self._connection.send_message(websocket_api.event_message(self._msg_id, {"seq": self.seq, "ended": True}))
+        self._connection.subscriptions.pop(self._msg_id, None)
+        self._async_stop()
+
+    @callback
+    def _async_handle_update(self):
+        coordinator = self._coordinator
+        if coordinator.last_update_success and coordinator.data is not None and not self._full:
+            if coordinator.changed_keys is None:
+                self._full = True
+            else:
+                data = coordinator.data
+                for key in coordinator.changed_keys:
+                    value = data.get(key)
+                    if value is None or numeric_value(value) is not None:
+                        self._pending[key] = value
+        self.async_send_pending()
+
+    @callback
+    def async_send_pending(self):
+        """Send what changed since the last message, unless the client is held back."""
+        if self._cancel_timer is not None:
+            return
+        if self._window and self.seq - self._acked >= self._window:
+            # The next ack sends everything merged meanwhile
+            return
+        wait = self._last_sent + self._min_interval - time.monotonic()
+        if wait > 0:
+            self._cancel_timer = async_call_later(self._hass, wait, self._async_timer_done)
+            return
+        coordinator = self._coordinator
+        available = coordinator.last_update_success
+        message = {}
+        if available != self._available:
+            message["available"] = self._available = available
+        if self._full and coordinator.data is not None:
+            message["full"] = True
+            message["data"] = {
+                key: value
+                for key, value in coordinator.data.items()
+                if numeric_value(value) is not None
+            }
+            self._full = False
+            self._pending = {}
+        elif self._pending:
+            message["data"] = self._pending
+            self._pending = {}
+        if not message:
+            return
+        if coordinator.stale:
+            message["stale"] = True
+        self.seq += 1
+        message["seq"] = self.seq
+        self._last_sent = time.monotonic()
+        self._connection.send_message(websocket_api.event_message(self._msg_id, message))
+
+    @callback
+    def _async_timer_done(self, _now):
+        self._cancel_timer = None
+        self.async_send_pending()
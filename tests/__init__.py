@@ -0,0 +1 @@
+"""Tests of the ADA meter integration."""
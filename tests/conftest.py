@@ -0,0 +1,28 @@
+"""Helpers shared by the tests."""
+import importlib
+import json
+import sys
+import types
+from pathlib import Path
+
+COMPONENT = Path(__file__).resolve().parent.parent / "custom_components" / "adap1ii"
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+_STANDALONE = "adap1ii_standalone"
+
+
+def load_module(name):
+    """Import a module of the integration without its __init__, which needs Home Assistant.
+
+    Only modules that do not import Home Assistant themselves can be loaded
+    this way, like in ``benchmarks/bench_decode.py``.
+    """
+    if _STANDALONE not in sys.modules:
+        package = types.ModuleType(_STANDALONE)
+        package.__path__ = [str(COMPONENT)]
+        sys.modules[_STANDALONE] = package
+    return importlib.import_module(f"{_STANDALONE}.{name}")
+
+
+def load_payload(product_type):
+    """Return the sample payload of a product."""
+    return json.loads((FIXTURES / f"{product_type}.json").read_text())
@@ -0,0 +1,71 @@
+"""Site totals across restarts, with meter coordinator stand-ins.
+
+They need Home Assistant and pytest-homeassistant-custom-component, for the
+``hass`` and ``hass_storage`` fixtures, and are skipped without them.
+"""
+from datetime import timedelta
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import async_fire_time_changed  # noqa: E402
+
+from .conftest import load_module  # noqa: E402
+
+aggregate = load_module("aggregate")
+
+ENTRY_ID = "site"
+ENERGY = "active_import_energy_total"
+POWER = "instantaneous_power_import"
+
+
+class FakeMeter:
+    def __init__(self, energy, power):
+        self.data = {ENERGY: energy, POWER: power}
+        self.last_update_success = True
+        self.stale = False
+        self.changed_keys = None
+        self._listeners = []
+
+    def async_add_listener(self, listener):
+        self._listeners.append(listener)
+        return lambda: self._listeners.remove(listener)
+
+
+async def start_site(hass, meters):
+    hass.data[aggregate.DOMAIN] = {"entries": meters}
+    site = aggregate.SiteAggregator(hass, ENTRY_ID, ("a", "b"))
+    await site.async_load()
+    site.async_start()
+    return site
+
+
+async def test_counters_are_carried_over_a_restart(hass, hass_storage):
+    assert ENERGY in aggregate.CARRIED_KEYS
+    site = await start_site(hass, {"a": FakeMeter(100.0, 1.0), "b": FakeMeter(50.0, 2.0)})
+    assert site.data[ENERGY]["value"] == 150.0
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=aggregate.SAVE_DELAY + 1))
+    await hass.async_block_till_done()
+    site.async_stop()
+
+    # Meter b is still down after the restart
+    site = await start_site(hass, {"a": FakeMeter(101.0, 1.0)})
+    assert site.data[ENERGY] == {"value": 151.0, "missing": ("b",)}
+    # Instantaneous values of a missing meter are not carried
+    assert site.data[POWER]["value"] == 1.0
+    site.async_stop()
+
+
+async def test_counters_of_removed_meters_are_not_restored(hass, hass_storage):
+    hass_storage[f"{aggregate.DOMAIN}.aggregate.{ENTRY_ID}"] = {
+        "version": aggregate.STORE_VERSION,
+        "minor_version": 1,
+        "key": f"{aggregate.DOMAIN}.aggregate.{ENTRY_ID}",
+        "data": {"b": {ENERGY: 50.0, POWER: 2.0}, "gone": {ENERGY: 900.0}},
+    }
+    site = await start_site(hass, {"a": FakeMeter(100.0, 1.0)})
+    assert site.data[ENERGY]["value"] == 150.0
+    assert site.data[POWER]["value"] == 1.0
+    site.async_stop()
@@ -0,0 +1,43 @@
+"""Replay of capture files, including one a crash left unfinished.
+
+They need Home Assistant and pytest-homeassistant-custom-component, for the
+``hass`` fixture, and are skipped without them.
+"""
+import gzip
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from .conftest import load_module  # noqa: E402
+
+capture = load_module("capture")
+
+
+def write_capture(path, complete, unfinished):
+    """Write one finished gzip member, then one cut off before its end like after a crash."""
+    finished = gzip.compress(b"".join(capture.encode_record(t, body) for t, body in complete))
+    cut = gzip.compress(b"".join(capture.encode_record(t, body) for t, body in unfinished))
+    path.write_bytes(finished + cut[: len(cut) // 2])
+
+
+async def test_replay_stops_at_an_unfinished_block(hass, tmp_path):
+    path = tmp_path / "meter.jsonl.gz"
+    write_capture(path, [(1.0, b'{"a": 1}'), (2.0, b'{"a": 2}')], [(3.0, b'{"a": 3}' * 50)])
+    source = capture.ReplaySource(hass, str(path))
+    records = []
+    while (record := await source.async_next()) is not None:
+        records.append(record)
+    assert [(record["t"], record["body"]) for record in records] == [(1.0, b'{"a": 1}'), (2.0, b'{"a": 2}')]
+    # Reading on past the end keeps answering the end
+    assert await source.async_next() is None
+    await source.async_close()
+
+
+async def test_first_body_of_an_unfinished_capture(hass, tmp_path):
+    path = tmp_path / "meter.jsonl.gz"
+    write_capture(path, [], [(1.0, b'{"a": 1}' * 50)])
+    with pytest.raises(ValueError, match="No payload captured"):
+        capture.read_first_body(str(path))
+    write_capture(path, [(1.0, b'{"a": 1}')], [(2.0, b'{"a": 2}' * 50)])
+    assert capture.read_first_body(str(path)) == b'{"a": 1}'
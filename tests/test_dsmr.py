@@ -0,0 +1,131 @@
+"""P1 telegram parsing and the stream reader, against a local socket stand-in."""
+import asyncio
+
+import pytest
+
+from .conftest import load_module
+
+dsmr = load_module("dsmr")
+
+BODY = (
+    b"/AUX59902759988\r\n"
+    b"\r\n"
+    b"0-0:1.0.0(241018121530S)\r\n"
+    b"0-0:96.1.0(1SAG1100123456)\r\n"
+    b"1-0:1.8.0(018234.512*kWh)\r\n"
+    b"1-0:32.7.0(231.4*V)\r\n"
+    b"1-0:31.7.0(003*A)\r\n"
+    b"!"
+)
+
+
+def telegram(body=BODY, crc=True):
+    """Return a full telegram, with its CRC line or the empty one of DSMR 2.2/3.0."""
+    checksum = f"{dsmr.crc16(body):04X}".encode() if crc else b""
+    return body + checksum + b"\r\n"
+
+
+def test_parse_values():
+    (data,) = dsmr.TelegramParser().feed(telegram())
+
+    assert data["active_import_energy_total"] == 18234.512
+    assert data["voltage_phase_l1"] == 231.4
+    assert data["meter_serial_number"] == "1SAG1100123456"
+    assert data["timestamp"] == "241018121530S"
+
+
+@pytest.mark.parametrize("size", [1, 7, 64])
+def test_chunked_feed(size):
+    parser = dsmr.TelegramParser()
+    stream = b"garbage before" + telegram() + telegram()
+    decoded = []
+    for start in range(0, len(stream), size):
+        decoded.extend(parser.feed(stream[start:start + size]))
+
+    assert len(decoded) == 2
+    assert parser.telegrams == 2
+    assert parser.crc_errors == 0
+
+
+def test_bad_crc_is_dropped():
+    parser = dsmr.TelegramParser()
+    corrupted = telegram().replace(b"231.4", b"239.4")
+
+    assert parser.feed(corrupted) == []
+    assert parser.crc_errors == 1
+    # The stream recovers with the next telegram
+    assert len(parser.feed(telegram())) == 1
+
+
+def test_unreadable_crc_is_dropped():
+    parser = dsmr.TelegramParser()
+
+    assert parser.feed(BODY + b"XYZQ\r\n") == []
+    assert parser.crc_errors == 1
+
+
+def test_telegram_without_crc():
+    parser = dsmr.TelegramParser()
+    (data,) = parser.feed(telegram(crc=False))
+
+    assert data["voltage_phase_l1"] == 231.4
+    assert parser.crc_errors == 0
+
+
+def test_oversize_garbage_is_discarded():
+    parser = dsmr.TelegramParser()
+
+    # A start marker followed by endless bytes without an end marker
+    assert parser.feed(b"/" + b"x" * (dsmr.MAX_TELEGRAM_SIZE + 1)) == []
+    assert len(parser._buffer) == 0
+    assert parser.feed(b"no start marker at all" * 100) == []
+    assert len(parser._buffer) == 0
+    assert len(parser.feed(telegram())) == 1
+
+
+async def _serve(payload_chunks):
+    async def handle(reader, writer):
+        for chunk in payload_chunks:
+            writer.write(chunk)
+            await writer.drain()
+            await asyncio.sleep(0.01)
+        writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def test_read_telegram_from_stream():
+    async def run():
+        stream = telegram().replace(b"231.4", b"239.4") + telegram()
+        server, port = await _serve([stream[:40], stream[40:200], stream[200:]])
+        async with server:
+            return await dsmr.async_read_telegram("127.0.0.1", port, timeout=5)
+
+    data = asyncio.run(run())
+    # The corrupted first telegram is skipped
+    assert data["voltage_phase_l1"] == 231.4
+
+
+def test_read_telegram_stream_closed():
+    async def run():
+        server, port = await _serve([b"/AUX partial telegram"])
+        async with server:
+            await dsmr.async_read_telegram("127.0.0.1", port, timeout=5)
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run())
+
+
+def test_read_telegram_timeout():
+    async def run():
+        async def silent(reader, writer):
+            await asyncio.sleep(1)
+            writer.close()
+
+        server = await asyncio.start_server(silent, "127.0.0.1", 0)
+        async with server:
+            await dsmr.async_read_telegram("127.0.0.1", server.sockets[0].getsockname()[1], timeout=0.1)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(run())
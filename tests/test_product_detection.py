@@ -0,0 +1,66 @@
+"""Product detection against sample payloads."""
+import pytest
+
+from .conftest import load_module, load_payload
+
+product_config = load_module("product_config")
+PRODUCTS = list(product_config.PRODUCT_CONFIGS)
+
+
+@pytest.mark.parametrize("product_type", PRODUCTS)
+def test_sample_payload_detected(product_type):
+    payload = load_payload(product_type)
+    ranking = product_config.rank_products(payload)
+
+    assert product_config.detect_product(payload) == product_type
+    assert ranking[0] == (product_type, 1.0)
+    assert not product_config.is_ambiguous(ranking)
+
+
+@pytest.mark.parametrize("product_type", PRODUCTS)
+def test_detection_limited_to_candidates(product_type):
+    payload = load_payload(product_type)
+    others = [other for other in PRODUCTS if other != product_type]
+
+    assert product_config.detect_product(payload, [product_type]) == product_type
+    ranking = product_config.rank_products(payload, others)
+    assert all(other in others for other, _score in ranking)
+
+
+def test_ada12_payload_is_not_an_ada_one():
+    # Every ADA One key is also an ADA P1 Meter key
+    ada12 = set(product_config.get_product_sensors("ada12"))
+    adaone = set(product_config.get_product_sensors("adaone"))
+    assert adaone < ada12
+
+    ranking = dict(product_config.rank_products(load_payload("ada12")))
+    assert ranking["adaone"] < product_config.MIN_MATCH_SCORE
+    assert product_config.detect_product(load_payload("adaone")) == "adaone"
+
+
+def test_partial_ada12_payload_is_ambiguous():
+    # An ADA One payload with some ADA P1 Meter extras fits both about as well
+    payload = load_payload("adaone")
+    extras = sorted(
+        set(product_config.get_product_sensors("ada12")) - set(product_config.get_product_sensors("adaone"))
+    )
+    payload.update((key, 1.0) for key in extras[:10])
+    ranking = product_config.rank_products(payload)
+
+    assert {product_type for product_type, _score in ranking[:2]} == {"ada12", "adaone"}
+    assert product_config.is_ambiguous(ranking)
+
+
+def test_unrelated_payload_matches_nothing():
+    payload = {"temperature": 21.5, "humidity": 40, "wifi_ssid": "home-ap"}
+
+    assert product_config.rank_products(payload) == []
+    assert product_config.detect_product(payload) is None
+    assert not product_config.is_ambiguous([])
+
+
+def test_weak_match_is_rejected():
+    # A couple of shared keys are not enough to call it an ADA P1 Meter
+    payload = {"voltage_phase_l1": 230.1, "current_phase_l1": 1.2}
+
+    assert product_config.detect_product(payload, ["ada12"]) is None
@@ -0,0 +1,165 @@
+"""Tests of the statistics backfill, against a stand-in for the recorder.
+
+They need Home Assistant and pytest-homeassistant-custom-component, for the
+``hass`` and ``hass_storage`` fixtures, and are skipped without them.
+"""
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.helpers import entity_registry as er  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import async_fire_time_changed  # noqa: E402
+
+from .conftest import load_module  # noqa: E402
+
+statistics = load_module("statistics")
+
+ENTRY_ID = "entry"
+UNIQUE_ID = "http://meter_ada12_energy_import"
+STATISTIC_ID = "sensor.meter_energy_import"
+# 2026-01-01 00:00 UTC, a round hour
+T0 = 1767225600
+HOUR = statistics.HOUR
+
+
+class FakeRecorder:
+    """Answers ``get_last_statistics`` and takes imports like the recorder, in memory.
+
+    Rows are keyed by their start, so an import replaces rows like the
+    real one does.
+    """
+
+    def __init__(self, hass, rows):
+        self._hass = hass
+        self.rows = {row["start"]: row for row in rows}
+        self.imports = []
+
+    def async_add_executor_job(self, target, *args):
+        return self._hass.async_add_executor_job(target, *args)
+
+    def get_last_statistics(self, hass, number, statistic_id, convert_units, types):
+        newest = sorted(self.rows.values(), key=lambda row: row["start"], reverse=True)[:number]
+        return {statistic_id: [dict(row) for row in newest]} if newest else {}
+
+    def async_import_statistics(self, hass, metadata, rows):
+        self.imports.append((metadata, rows))
+        for row in rows:
+            start = row["start"].timestamp()
+            self.rows[start] = {"start": start, "state": row["state"], "sum": row["sum"]}
+
+
+class FakeCoordinator:
+    def __init__(self, value):
+        self.data = {"energy_import": value}
+        self.last_update_success = True
+        self.stale = False
+
+
+@pytest.fixture
+def recorder(hass, monkeypatch):
+    # The last row before the gap: 100 kWh read, 40 kWh summed so far
+    fake = FakeRecorder(hass, [{"start": T0 - HOUR, "state": 100.0, "sum": 40.0}])
+    monkeypatch.setattr(statistics, "get_instance", lambda hass: fake)
+    monkeypatch.setattr(statistics, "get_last_statistics", fake.get_last_statistics)
+    monkeypatch.setattr(statistics, "async_import_statistics", fake.async_import_statistics)
+    return fake
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [float(T0)]
+    monkeypatch.setattr(statistics, "time", SimpleNamespace(time=lambda: now[0]))
+    return now
+
+
+@pytest.fixture
+def statistic_entity(hass):
+    entry = er.async_get(hass).async_get_or_create(
+        "sensor", statistics.DOMAIN, UNIQUE_ID, suggested_object_id="meter_energy_import"
+    )
+    assert entry.entity_id == STATISTIC_ID
+    return entry
+
+
+def backfill(hass, value):
+    return statistics.StatisticsBackfill(
+        hass, FakeCoordinator(value), ENTRY_ID, {"energy_import": (UNIQUE_ID, "kWh")}
+    )
+
+
+def stored_sample(hass_storage, t, v):
+    hass_storage[f"{statistics.DOMAIN}.backfill.{ENTRY_ID}"] = {
+        "version": statistics.STORE_VERSION,
+        "minor_version": 1,
+        "key": f"{statistics.DOMAIN}.backfill.{ENTRY_ID}",
+        "data": {"energy_import": {"t": t, "v": v}},
+    }
+
+
+async def test_build_rows_interpolates_and_anchors_the_sum(hass, recorder):
+    # 100 kWh at 00:30, 104 kWh at 04:30: 1 kWh per hour over four hours
+    rows = await backfill(hass, 0)._async_build_rows(
+        STATISTIC_ID, T0 + HOUR / 2, 100.0, T0 + 4.5 * HOUR, 104.0
+    )
+    assert [row["start"] for row in rows] == [
+        datetime.fromtimestamp(T0 + index * HOUR, timezone.utc) for index in range(4)
+    ]
+    assert [row["state"] for row in rows] == [100.5, 101.5, 102.5, 103.5]
+    # The sum goes on from the row before the gap
+    assert [row["sum"] for row in rows] == [40.5, 41.5, 42.5, 43.5]
+
+
+async def test_build_rows_skips_without_an_anchor(hass, recorder):
+    recorder.rows.clear()
+    rows = await backfill(hass, 0)._async_build_rows(STATISTIC_ID, T0, 100.0, T0 + 3 * HOUR, 103.0)
+    assert rows == []
+
+
+async def test_build_rows_gives_up_on_long_gaps(hass, recorder):
+    limit = statistics.MAX_BACKFILL_HOURS
+    rows = await backfill(hass, 0)._async_build_rows(
+        STATISTIC_ID, T0, 100.0, T0 + limit * HOUR, 100.0 + limit
+    )
+    assert len(rows) == limit
+    rows = await backfill(hass, 0)._async_build_rows(
+        STATISTIC_ID, T0, 100.0, T0 + (limit + 1) * HOUR, 101.0 + limit
+    )
+    assert rows == []
+
+
+async def test_backfill_is_idempotent_after_reloading_the_store(
+    hass, hass_storage, recorder, clock, statistic_entity
+):
+    stored_sample(hass_storage, T0 + HOUR / 2, 100.0)
+    clock[0] = T0 + 4.5 * HOUR
+
+    first = backfill(hass, 104.0)
+    await first.async_load()
+    first.async_handle_update()
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert len(recorder.imports) == 1
+    metadata, rows = recorder.imports[0]
+    assert metadata["statistic_id"] == STATISTIC_ID
+    assert metadata["unit_class"] == "energy"
+    assert [row["sum"] for row in rows] == [40.5, 41.5, 42.5, 43.5]
+
+    # Home Assistant stopped before the new sample was saved: the same gap again
+    second = backfill(hass, 104.0)
+    await second.async_load()
+    second.async_handle_update()
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert len(recorder.imports) == 2
+    assert recorder.imports[1][1] == rows
+
+    # Once saved, the reloaded sample no longer looks like a gap
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=statistics.SAVE_DELAY + 1))
+    await hass.async_block_till_done(wait_background_tasks=True)
+    third = backfill(hass, 104.0)
+    await third.async_load()
+    third.async_handle_update()
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert len(recorder.imports) == 2